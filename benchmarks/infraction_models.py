@@ -0,0 +1,69 @@
+"""
+Micro-benchmarks of the Infraction model: decoding from config JSON, memory per infraction and
+scanning for expired infractions.
+
+Run from the repository root::
+
+    python -m benchmarks.infraction_models --infractions 200000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from modplus.models import Infraction, InfractionType, MemberRef
+
+GUILD_ID = 1
+SNOWFLAKE = 10**17
+
+
+def generate(count: int) -> list[dict]:
+    rng = random.Random(1)
+    now = datetime.now(timezone.utc)
+    ref = MemberRef(GUILD_ID, SNOWFLAKE)
+    return [
+        Infraction(
+            rng.choice(list(InfractionType)),
+            f"reason {rng.randrange(2000)}",
+            now - timedelta(seconds=rng.randrange(10**8)),
+            rng.choice([None, timedelta(hours=1)]),
+            ref,
+            SNOWFLAKE + rng.randrange(50),
+            id=str(i + 1),
+        ).json
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--infractions", type=int, default=200_000)
+    args = parser.parse_args()
+
+    rows = generate(args.infractions)
+    ref = MemberRef(GUILD_ID, SNOWFLAKE)
+
+    start = time.perf_counter()
+    infractions = [Infraction.from_json(row, ref) for row in rows]
+    decode = time.perf_counter() - start
+    del infractions
+
+    tracemalloc.start()
+    infractions = [Infraction.from_json(row, ref) for row in rows]
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    expired = sum(1 for inf in infractions if inf.expired)
+    scan = time.perf_counter() - start
+
+    lossless = all(inf.json == row for inf, row in zip(infractions, rows))
+
+    print(f"decode: {len(rows) / decode / 1000:.0f}k infractions/s")
+    print(f"memory: {memory / len(rows):.0f} B/infraction")
+    print(f"expiry scan: {scan * 1000:.0f} ms, {expired} expired")
+    print(f"round trip: {'lossless' if lossless else 'LOSSY'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Load time and memory of a large guild's infractions for each storage backend.
+
+A synthetic guild is written once as the INFRACTIONS config document (JSON) and as a
+`ColumnarInfractionStore` file. Generating and each load run in their own process, so the peak
+RSS a backend reports is its own. Linux keeps the peak across fork and exec, which is why the
+parent stays small.
+
+Run from the repository root::
+
+    python -m benchmarks.infraction_storage --infractions 500000 --members 50000
+"""
+import argparse
+import json
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from modplus.cache import InfractionCache
+from modplus.models import Infraction, InfractionType, MemberRef
+from modplus.store import ColumnarInfractionStore
+
+GUILD_ID = 1
+SNOWFLAKE = 10**17
+REASONS = ["spam", "raid", "nsfw", "toxicity", "ads", "alt account"] + [
+    f"custom reason {i}" for i in range(2000)
+]
+
+
+def generate(path: Path, infractions: int, members: int):
+    rng = random.Random(1)
+    now = datetime.now(timezone.utc)
+    guild: dict[int, list[Infraction]] = {}
+    for i in range(infractions):
+        user_id = SNOWFLAKE + rng.randrange(members)
+        guild.setdefault(user_id, []).append(
+            Infraction(
+                rng.choice(list(InfractionType)),
+                rng.choice(REASONS),
+                now - timedelta(seconds=rng.randrange(10**8)),
+                rng.choice([None, timedelta(hours=1)]),
+                MemberRef(GUILD_ID, user_id),
+                SNOWFLAKE + rng.randrange(50),
+                id=str(i + 1),
+            )
+        )
+
+    document = {str(user_id): [inf.json for inf in infs] for user_id, infs in guild.items()}
+    (path / "settings.json").write_text(json.dumps(document))
+    ColumnarInfractionStore(path / "columnar").save_guild(GUILD_ID, guild)
+
+
+def load(path: Path, backend: str):
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if backend == "config":
+        # Red's JSON driver keeps the parsed document alive as well, so it counts towards memory
+        document = json.loads((path / "settings.json").read_text())
+        members = InfractionCache._decode_members(GUILD_ID, document)
+    else:
+        members = ColumnarInfractionStore(path / "columnar").load_guild(GUILD_ID)
+    elapsed = time.perf_counter() - start
+    # ru_maxrss is KiB on Linux
+    peak = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - base) / 1024
+
+    count = sum(map(len, members.values()))
+    print(f"{backend:>8}: {count} infractions in {elapsed:.2f}s, peak RSS +{peak:.0f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--infractions", type=int, default=500_000)
+    parser.add_argument("--members", type=int, default=50_000)
+    parser.add_argument(
+        "--step", choices=("generate", "config", "columnar"), help=argparse.SUPPRESS
+    )
+    parser.add_argument("--path", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.step == "generate":
+        return generate(args.path, args.infractions, args.members)
+    if args.step:
+        return load(args.path, args.step)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for step in ("generate", "config", "columnar"):
+            command = [sys.executable, "-m", __spec__.name, *sys.argv[1:]]
+            subprocess.run([*command, "--step", step, "--path", tmp], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import time
+from collections import OrderedDict, deque
+from datetime import timedelta
+from typing import Any, Mapping, NamedTuple, Optional
+
+__all__ = ("AutomodAction", "WindowRule", "AutomodRules", "AutomodWindows")
+
+
+class AutomodAction(NamedTuple):
+    command: str
+    duration: Optional[timedelta]
+
+    @classmethod
+    def parse(cls, value: Any) -> "AutomodAction":
+        # stored as "action" or "action seconds". Very old configs stored a tempban as its seconds.
+        if isinstance(value, int):
+            return cls("ban", timedelta(seconds=value))
+
+        action, _, seconds = value.partition(" ")
+        duration = timedelta(seconds=int(seconds)) if seconds else None
+        # a tempban is a ban with a duration, there's no command of its own for it.
+        return cls("ban" if action == "tempban" else action, duration)
+
+
+class WindowRule(NamedTuple):
+    # an infraction type, "infraction" for any infraction or "flag" for a flagged message
+    kind: str
+    count: int
+    seconds: int
+    action: AutomodAction
+
+    @classmethod
+    def from_json(cls, data: dict) -> "WindowRule":
+        return cls(
+            data["kind"], data["count"], data["seconds"], AutomodAction.parse(data["action"])
+        )
+
+
+class AutomodRules:
+    """
+    A guild's automod settings prepared for lookups.
+
+    Config hands back the warn counts as strings, so they're converted to ints and the actions
+    parsed once here instead of on every infraction. Window rules are stored under the `windows`
+    key of the same setting and are grouped by what they count, strictest first.
+    """
+
+    __slots__ = ("thresholds", "windows")
+
+    def __init__(self, automod: Mapping[str, Any]):
+        self.thresholds: dict[int, AutomodAction] = {
+            int(count): AutomodAction.parse(action)
+            for count, action in automod.items()
+            if count != "windows"
+        }
+        self.windows: dict[str, list[WindowRule]] = {}
+        for rule in map(WindowRule.from_json, automod.get("windows", ())):
+            self.windows.setdefault(rule.kind, []).append(rule)
+        for rules in self.windows.values():
+            rules.sort(key=lambda x: (-x.count, x.seconds))
+
+    def for_warns(self, count: int) -> Optional[AutomodAction]:
+        return self.thresholds.get(count)
+
+
+class AutomodWindows:
+    """
+    Recent event times per member, for evaluating window rules.
+
+    Each (guild, member, kind) gets a ring buffer as long as the largest count any rule for that
+    kind needs, so checking a rule is one subtraction against the Nth newest event. Buffers of
+    the least recently active members are dropped once more than `max_members` are tracked.
+    """
+
+    def __init__(self, max_members: int):
+        self.max_members = max_members
+        self._buffers: OrderedDict[tuple[int, int, str], deque[float]] = OrderedDict()
+
+    def record(
+        self, guild_id: int, user_id: int, kinds: tuple[str, ...], rules: AutomodRules
+    ) -> Optional[WindowRule]:
+        """
+        Record an event of each of `kinds` and return the first window rule it breaks, if any.
+
+        The broken rule's buffer is emptied so the member has to break it again to be actioned
+        again.
+        """
+        now = time.monotonic()
+        broken = None
+        for kind in kinds:
+            if not (kind_rules := rules.windows.get(kind)):
+                continue
+
+            key = (guild_id, user_id, kind)
+            size = kind_rules[0].count
+            buffer = self._buffers.get(key)
+            if buffer is None or buffer.maxlen != size:
+                # rules changed since the buffer was made
+                buffer = self._buffers[key] = deque(buffer or (), maxlen=size)
+            self._buffers.move_to_end(key)
+            buffer.append(now)
+
+            if broken is None:
+                for rule in kind_rules:
+                    if len(buffer) >= rule.count and now - buffer[-rule.count] <= rule.seconds:
+                        broken = rule
+                        buffer.clear()
+                        break
+
+        while len(self._buffers) > self.max_members:
+            self._buffers.popitem(last=False)
+
+        return broken
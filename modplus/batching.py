@@ -0,0 +1,83 @@
+import time
+from typing import NamedTuple
+import discord
+
+from .deadlines import DeadlineQueue
+
+__all__ = ("LogBatch", "LogBatcher")
+
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = 6000
+MAX_CONTENT = 2000
+
+
+class LogBatch(NamedTuple):
+    channel: discord.abc.Messageable
+    entries: list[dict]
+
+    def messages(self) -> list[dict]:
+        """
+        Pack the rendered entries into as few messages as Discord's limits allow.
+        """
+        messages: list[dict] = []
+        content, embeds, chars = [], [], 0
+
+        def emit():
+            nonlocal content, embeds, chars
+            if content or embeds:
+                messages.append({"content": "\n".join(content) or None, "embeds": embeds})
+            content, embeds, chars = [], [], 0
+
+        for entry in self.entries:
+            text, embed = entry.get("content"), entry.get("embed")
+            size = len(embed) if embed else 0
+            if (
+                (text and len("\n".join([*content, text])) > MAX_CONTENT)
+                or (embed and (len(embeds) == MAX_EMBEDS or chars + size > MAX_EMBED_CHARS))
+            ):
+                emit()
+            if text:
+                content.append(text)
+            if embed:
+                embeds.append(embed)
+                chars += size
+
+        emit()
+        return messages
+
+
+class LogBatcher:
+    """
+    Per-guild queues of rendered log messages that are sent together.
+
+    The first entry queued for a guild starts its window. When the window ends, or as soon as the
+    guild has a full message worth of embeds, `next_batch` hands the queue to the background task
+    that sends it as multi-embed messages.
+    """
+
+    def __init__(self):
+        self._batches: dict[int, LogBatch] = {}
+        self._deadlines: DeadlineQueue[int] = DeadlineQueue(time.monotonic)
+
+    def add(self, guild_id: int, channel: discord.abc.Messageable, entry: dict, window: float):
+        batch = self._batches.get(guild_id)
+        if batch is None:
+            batch = self._batches[guild_id] = LogBatch(channel, [])
+            self._deadlines.schedule(guild_id, time.monotonic() + window)
+
+        batch.entries.append(entry)
+        if sum("embed" in x for x in batch.entries) >= MAX_EMBEDS:
+            self._deadlines.schedule(guild_id, 0)
+
+    def pop_all(self) -> list[LogBatch]:
+        batches = list(self._batches.values())
+        self._batches.clear()
+        self._deadlines.clear()
+        return batches
+
+    async def next_batch(self) -> LogBatch:
+        """
+        Wait until a guild's batch is due, remove it from the queue and return it.
+        """
+        guild_id = await self._deadlines.next_due()
+        return self._batches.pop(guild_id)
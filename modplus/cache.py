@@ -0,0 +1,789 @@
+import asyncio
+import bisect
+import heapq
+import itertools
+import re
+import time
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Collection,
+    Generic,
+    Mapping,
+    NamedTuple,
+    Optional,
+    TypeVar,
+)
+from redbot.core import Config
+from .deadlines import DeadlineQueue
+from .models import Infraction, InfractionType, MemberRef
+from .scheduler import ExpiryScheduler
+from .store import ColumnarInfractionStore
+
+DAY_US = 86_400_000_000
+
+T = TypeVar("T")
+
+__all__ = (
+    "InfractionCache",
+    "GuildSettingsCache",
+    "SnapshotCache",
+    "ShorthandMatcher",
+    "WatchlistEntry",
+    "WatchlistIndex",
+)
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _same_infraction(a: Infraction, b: Infraction) -> bool:
+    # what an exported copy of an infraction still matches on after the id
+    return (a.violator.user_id, a.at_us, a.type) == (b.violator.user_id, b.at_us, b.type)
+
+
+class InfractionCache:
+    """
+    A write-through, per-guild index of decoded infractions.
+
+    A guild's infractions are read from storage and decoded once, the first time that guild is
+    accessed. After that every read is served from memory and every write updates both the index
+    and storage.
+
+    Storage is either config (the default) or a `ColumnarInfractionStore`. In config each guild's
+    infractions are one document in the INFRACTIONS custom group, so changing any number of
+    members is one write. Writes to the columnar store are buffered per guild and written out by
+    `flush`.
+
+    New infractions get their id from a per-guild counter when they're added, so ids are short,
+    unique within the guild and sort in the order the infractions were issued. Legacy 8 character
+    hex ids keep working; the rare duplicates among them are renumbered when the guild is loaded.
+
+    Each member's count of active warns is kept up to date as infractions are added and removed,
+    and warns are taken off the count as they expire, so automod never has to recount a history.
+
+    Secondary indexes by issuer, type and day issued are kept for `search`, so a query only looks
+    at infractions that match its most selective filter.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        store: ColumnarInfractionStore,
+        expiries: Optional[ExpiryScheduler] = None,
+    ):
+        self.config = config
+        self.store = store
+        # renumbered tempbans move their scheduled expiry along with them
+        self.expiries = expiries
+        self._backend: Optional[str] = None
+        self._dirty_guilds: set[int] = set()
+        # guild_id -> user_id -> infractions (in insertion order)
+        self._members: dict[int, dict[int, list[Infraction]]] = {}
+        # guild_id -> infraction_id -> infraction
+        self._ids: dict[int, dict[str, Infraction]] = {}
+        # guild_id -> last id handed out
+        self._counters: dict[int, int] = {}
+        # guild_id -> active warn id -> its expiry in microseconds (None if it never expires)
+        self._warns: dict[int, dict[str, Optional[int]]] = {}
+        # guild_id -> user_id -> number of active warns
+        self._warn_counts: dict[int, dict[int, int]] = {}
+        # guild_id -> heap of (expiry, warn id, user_id)
+        self._warn_expiries: dict[int, list[tuple[int, str, int]]] = {}
+        # guild_id -> ("issuer", id) | ("type", InfractionType) | ("day", days since epoch)
+        # -> infractions. Sets hold the infraction objects so renumbering doesn't touch them.
+        self._index: dict[int, dict[tuple[str, Any], set[Infraction]]] = {}
+        # guild_id -> sorted days that have an index entry, for date range queries
+        self._days: dict[int, list[int]] = {}
+        # guild_id -> str(user_id) -> stored json of their infractions, the guild's config document
+        self._documents: dict[int, dict[str, list[dict]]] = {}
+        self._locks: dict[int, asyncio.Lock] = {}
+        # serializes config writes per guild so `add_many` can't race single member saves
+        self._write_locks: dict[int, asyncio.Lock] = {}
+        self._migrate_lock = asyncio.Lock()
+        self._migrated = False
+
+    async def _ensure_guild(self, guild_id: int):
+        if guild_id in self._members:
+            return
+
+        async with self._locks.setdefault(guild_id, asyncio.Lock()):
+            if guild_id in self._members:
+                # another task loaded it while we were waiting for the lock
+                return
+
+            if await self._get_backend() == "columnar":
+                members = await asyncio.to_thread(self.store.load_guild, guild_id)
+            else:
+                await self._ensure_migrated()
+                document = await self.config.custom("INFRACTIONS", guild_id).members()
+                self._documents[guild_id] = document
+                members = self._decode_members(guild_id, document)
+
+            last_id = await self.config.custom("INFRACTION_IDS", guild_id).last()
+            ids: dict[str, Infraction] = {}
+            duplicates: list[Infraction] = []
+            for infractions in members.values():
+                for inf in infractions:
+                    if inf.id in ids:
+                        duplicates.append(inf)
+                    else:
+                        ids[inf.id] = inf
+
+            self._ids[guild_id] = ids
+            self._counters[guild_id] = last_id
+            self._warns[guild_id] = {}
+            self._warn_counts[guild_id] = {}
+            self._warn_expiries[guild_id] = []
+            self._index[guild_id] = {}
+            self._days[guild_id] = []
+            for inf in ids.values():
+                self._count_warn(guild_id, inf)
+            for inf in (inf for infractions in members.values() for inf in infractions):
+                self._add_to_index(guild_id, inf)
+
+            self._members[guild_id] = members
+            if duplicates:
+                await self._renumber(guild_id, duplicates)
+
+    @staticmethod
+    def _index_keys(infraction: Infraction) -> tuple[tuple[str, Any], ...]:
+        return (
+            ("issuer", infraction.issuer_id),
+            ("type", infraction.type),
+            ("day", infraction.at_us // DAY_US),
+        )
+
+    def _add_to_index(self, guild_id: int, infraction: Infraction):
+        index = self._index[guild_id]
+        for key in self._index_keys(infraction):
+            if key not in index:
+                index[key] = set()
+                if key[0] == "day":
+                    bisect.insort(self._days[guild_id], key[1])
+            index[key].add(infraction)
+
+    def _remove_from_index(self, guild_id: int, infraction: Infraction):
+        index = self._index[guild_id]
+        for key in self._index_keys(infraction):
+            infractions = index[key]
+            infractions.discard(infraction)
+            if not infractions:
+                del index[key]
+                if key[0] == "day":
+                    days = self._days[guild_id]
+                    del days[bisect.bisect_left(days, key[1])]
+
+    def _count_warn(self, guild_id: int, infraction: Infraction):
+        if infraction.type is not InfractionType.WARN or infraction.expired:
+            return
+
+        user_id = infraction.violator.user_id
+        expires = infraction.at_us + infraction.duration_us if infraction.duration_us else None
+        self._warns[guild_id][infraction.id] = expires
+        counts = self._warn_counts[guild_id]
+        counts[user_id] = counts.get(user_id, 0) + 1
+        if expires is not None:
+            heapq.heappush(self._warn_expiries[guild_id], (expires, infraction.id, user_id))
+
+    def _uncount_warn(self, guild_id: int, infraction_id: str, user_id: int):
+        if self._warns[guild_id].pop(infraction_id, False) is False:
+            return
+
+        counts = self._warn_counts[guild_id]
+        counts[user_id] -= 1
+        if not counts[user_id]:
+            del counts[user_id]
+
+    def _expire_warns(self, guild_id: int):
+        heap, warns = self._warn_expiries[guild_id], self._warns[guild_id]
+        now = time.time_ns() // 1000
+        while heap and heap[0][0] < now:
+            expires, infraction_id, user_id = heapq.heappop(heap)
+            # entries for warns that were deleted or edited since are skipped
+            if warns.get(infraction_id, False) == expires:
+                self._uncount_warn(guild_id, infraction_id, user_id)
+
+    async def _renumber(self, guild_id: int, infractions: list[Infraction]):
+        # legacy ids were hashes of the issue time, so infractions issued in the same instant
+        # shared one. The oldest keeps it and the rest are given new ids.
+        infractions = sorted(infractions, key=lambda x: x.at_us)
+        moved: list[tuple[int, str, str]] = []
+        for inf, new_id in zip(infractions, await self._next_ids(guild_id, len(infractions))):
+            if inf.type is InfractionType.TEMPBAN:
+                moved.append((inf.violator.user_id, inf.id, new_id))
+            inf.id = new_id
+            self._ids[guild_id][inf.id] = inf
+            self._count_warn(guild_id, inf)
+
+        await self._save_many(guild_id, {inf.violator.user_id for inf in infractions})
+        if self.expiries is not None:
+            # otherwise the expiry would find the infraction that kept the id, see that it's
+            # another member's and drop the tempban without lifting it
+            for user_id, old_id, new_id in moved:
+                await self.expiries.move(guild_id, user_id, old_id, new_id)
+
+    async def _next_ids(self, guild_id: int, count: int = 1) -> list[str]:
+        ids = self._ids[guild_id]
+        last = self._counters[guild_id]
+        new_ids = []
+        while len(new_ids) < count:
+            last += 1
+            # skip numbers that happen to clash with an all-digit legacy id
+            if str(last) not in ids:
+                new_ids.append(str(last))
+
+        # bumped before awaiting so concurrent adds never get the same ids.
+        self._counters[guild_id] = last
+        await self.config.custom("INFRACTION_IDS", guild_id).last.set(last)
+        return new_ids
+
+    async def _get_backend(self) -> str:
+        if self._backend is None:
+            self._backend = await self.config.infraction_backend()
+        return self._backend
+
+    async def _ensure_migrated(self):
+        if self._migrated:
+            return
+
+        async with self._migrate_lock:
+            if not self._migrated and not await self.config.infractions_migrated():
+                await self._migrate_members()
+            self._migrated = True
+
+    async def _migrate_members(self):
+        # infractions used to live on each member, one config write per member.
+        for guild_id, members in (await self.config.all_members()).items():
+            document = {
+                str(user_id): data["infractions"]
+                for user_id, data in members.items()
+                if data.get("infractions")
+            }
+            if not document:
+                continue
+
+            await self.config.custom("INFRACTIONS", guild_id).members.set(document)
+            for user_id in document:
+                await self.config.member_from_ids(int(guild_id), int(user_id)).infractions.clear()
+
+        await self.config.infractions_migrated.set(True)
+
+    async def documents(self) -> dict[int, dict[str, list[dict]]]:
+        """
+        Every guild's infractions as stored in config, `{guild_id: {str(user_id): [json]}}`.
+        """
+        await self._ensure_migrated()
+        return {
+            int(guild_id): data["members"]
+            for guild_id, data in (await self.config.custom("INFRACTIONS").all()).items()
+            if data.get("members")
+        }
+
+    @staticmethod
+    def _decode_members(guild_id: int, document: dict) -> dict[int, list[Infraction]]:
+        decoded: dict[int, list[Infraction]] = {}
+        for user_id, infractions in document.items():
+            if not infractions:
+                continue
+
+            ref = MemberRef(guild_id, int(user_id))
+            decoded[int(user_id)] = [Infraction.from_json(x, ref) for x in infractions]
+        return decoded
+
+    async def _save(self, guild_id: int, user_id: int):
+        await self._save_many(guild_id, {user_id})
+
+    async def _save_many(self, guild_id: int, user_ids: set[int]):
+        for user_id in user_ids:
+            if not self._members[guild_id].get(user_id):
+                self._members[guild_id].pop(user_id, None)
+
+        if await self._get_backend() == "columnar":
+            self._dirty_guilds.add(guild_id)
+            return
+
+        # only the affected members are encoded again, the guild's document is written once
+        document = self._documents.setdefault(guild_id, {})
+        for user_id in user_ids:
+            if infractions := self._members[guild_id].get(user_id):
+                document[str(user_id)] = [inf.json for inf in infractions]
+            else:
+                document.pop(str(user_id), None)
+
+        group = self.config.custom("INFRACTIONS", guild_id)
+        async with self._write_locks.setdefault(guild_id, asyncio.Lock()):
+            if document:
+                await group.members.set(document)
+            else:
+                await group.clear()
+
+    async def flush(self):
+        """
+        Write out guilds with buffered changes. Only the columnar store buffers writes.
+        """
+        dirty, self._dirty_guilds = self._dirty_guilds, set()
+        while dirty:
+            guild_id = dirty.pop()
+            # copied so the index can keep changing while the file is written in a thread
+            members = {u: list(infs) for u, infs in self._members.get(guild_id, {}).items()}
+            try:
+                await asyncio.to_thread(self.store.save_guild, guild_id, members)
+            except Exception:
+                self._dirty_guilds.update((guild_id, *dirty))
+                raise
+
+    async def migrate(self, backend: str) -> int:
+        """
+        Move every guild's infractions to `backend` ("config" or "columnar").
+
+        Returns the number of guilds moved. The new copy is fully written before the backend is
+        switched and only then is the old copy removed.
+        """
+        if backend == await self._get_backend():
+            return 0
+
+        await self.flush()
+        if backend == "columnar":
+            guilds = {
+                guild_id: self._decode_members(guild_id, document)
+                for guild_id, document in (await self.documents()).items()
+            }
+            for guild_id, members in guilds.items():
+                await asyncio.to_thread(self.store.save_guild, guild_id, members)
+        else:
+            guilds = {
+                guild_id: await asyncio.to_thread(self.store.load_guild, guild_id)
+                for guild_id in self.store.guild_ids()
+            }
+            for guild_id, members in guilds.items():
+                await self.config.custom("INFRACTIONS", guild_id).members.set(
+                    {
+                        str(user_id): [inf.json for inf in infractions]
+                        for user_id, infractions in members.items()
+                    }
+                )
+
+        await self.config.infraction_backend.set(backend)
+        self._backend = backend
+        self._members.clear()
+        self._documents.clear()
+        self._ids.clear()
+        self._counters.clear()
+        self._warns.clear()
+        self._warn_counts.clear()
+        self._warn_expiries.clear()
+        self._index.clear()
+        self._days.clear()
+
+        for guild_id, members in guilds.items():
+            if backend == "columnar":
+                await self.config.custom("INFRACTIONS", guild_id).clear()
+            else:
+                self.store.delete_guild(guild_id)
+
+        return len(guilds)
+
+    async def get_infractions(self, guild_id: int, user_id: int) -> list[Infraction]:
+        await self._ensure_guild(guild_id)
+        # a copy so callers can't mutate the index by accident
+        return list(self._members[guild_id].get(user_id, ()))
+
+    async def get_infraction(
+        self, guild_id: int, user_id: int, infraction_id: str
+    ) -> Optional[Infraction]:
+        await self._ensure_guild(guild_id)
+        infraction = self._ids[guild_id].get(infraction_id)
+        if infraction is not None and infraction.violator.user_id == user_id:
+            return infraction
+        return None
+
+    async def active_warns(self, guild_id: int, user_id: int) -> int:
+        await self._ensure_guild(guild_id)
+        self._expire_warns(guild_id)
+        return self._warn_counts[guild_id].get(user_id, 0)
+
+    async def search(
+        self,
+        guild_id: int,
+        *,
+        user_id: Optional[int] = None,
+        issuer_id: Optional[int] = None,
+        types: Optional[set[InfractionType]] = None,
+        after_us: Optional[int] = None,
+        before_us: Optional[int] = None,
+        reason: Optional[str] = None,
+        active: Optional[bool] = None,
+    ) -> list[Infraction]:
+        """
+        Find a guild's infractions matching every filter given, newest first.
+
+        Candidates come from the smallest of the index entries the filters select (or the
+        member's own infractions when `user_id` is given), the rest of the filters are checked
+        against those only.
+        """
+        await self._ensure_guild(guild_id)
+        index = self._index[guild_id]
+
+        # each candidate is a list of index entries (or member histories) to chain together
+        candidates: list[list[Collection[Infraction]]] = []
+        if user_id is not None:
+            candidates.append([self._members[guild_id].get(user_id, ())])
+        if issuer_id is not None:
+            candidates.append([index.get(("issuer", issuer_id), ())])
+        if types is not None:
+            candidates.append([index.get(("type", t), ()) for t in types])
+        if after_us is not None or before_us is not None:
+            days = self._days[guild_id]
+            start = bisect.bisect_left(days, after_us // DAY_US) if after_us is not None else 0
+            end = (
+                bisect.bisect_right(days, before_us // DAY_US)
+                if before_us is not None
+                else len(days)
+            )
+            candidates.append([index[("day", day)] for day in days[start:end]])
+
+        if candidates:
+            pool = itertools.chain.from_iterable(
+                min(candidates, key=lambda entries: sum(map(len, entries)))
+            )
+        else:
+            pool = self._ids[guild_id].values()
+
+        reason = reason.casefold() if reason else None
+        results = [
+            inf
+            for inf in pool
+            if (user_id is None or inf.violator.user_id == user_id)
+            and (issuer_id is None or inf.issuer_id == issuer_id)
+            and (types is None or inf.type in types)
+            and (after_us is None or inf.at_us >= after_us)
+            and (before_us is None or inf.at_us <= before_us)
+            and (active is None or inf.expired is not active)
+            and (reason is None or reason in inf.reason.casefold())
+        ]
+        results.sort(key=lambda x: x.at_us, reverse=True)
+        return results
+
+    def _insert(self, guild_id: int, infraction: Infraction):
+        self._members[guild_id].setdefault(infraction.violator.user_id, []).append(infraction)
+        self._ids[guild_id][infraction.id] = infraction
+        self._count_warn(guild_id, infraction)
+        self._add_to_index(guild_id, infraction)
+
+    async def add(self, infraction: Infraction):
+        """
+        Store a new infraction, giving it an id first if it doesn't have one.
+        """
+        guild_id, user_id = infraction.violator.guild_id, infraction.violator.user_id
+        await self._ensure_guild(guild_id)
+        if infraction.id is None or infraction.id in self._ids[guild_id]:
+            (infraction.id,) = await self._next_ids(guild_id)
+        self._insert(guild_id, infraction)
+        await self._save(guild_id, user_id)
+
+    async def add_many(self, guild_id: int, infractions: list[Infraction]):
+        """
+        Store several new infractions in one guild, giving each an id, and save each member once.
+        """
+        await self._ensure_guild(guild_id)
+        new_ids = await self._next_ids(guild_id, len(infractions))
+        for infraction, new_id in zip(infractions, new_ids):
+            infraction.id = new_id
+            self._insert(guild_id, infraction)
+        await self._save_many(guild_id, {inf.violator.user_id for inf in infractions})
+
+    async def import_many(self, guild_id: int, infractions: list[Infraction]) -> int:
+        """
+        Store a batch of imported infractions, saving each affected member once.
+
+        Infractions the guild already has, the same id, member, time and type, are skipped. Ones
+        without an id, or whose id is taken by a different infraction, are given a new one.
+        Returns how many were stored.
+        """
+        await self._ensure_guild(guild_id)
+        ids = self._ids[guild_id]
+        imported: list[Infraction] = []
+        missing: list[Infraction] = []
+        for infraction in infractions:
+            existing = ids.get(infraction.id) if infraction.id is not None else None
+            if existing is None and infraction.id is not None:
+                self._insert(guild_id, infraction)
+                imported.append(infraction)
+            elif existing is None or not _same_infraction(existing, infraction):
+                missing.append(infraction)
+
+        # after the rest are in, so a new id can't clash with one later in the batch
+        for infraction, new_id in zip(missing, await self._next_ids(guild_id, len(missing))):
+            infraction.id = new_id
+            self._insert(guild_id, infraction)
+            imported.append(infraction)
+
+        user_ids = {inf.violator.user_id for inf in imported}
+        for user_id in user_ids:
+            # imported history can be older than what the member already has
+            self._members[guild_id][user_id].sort(key=lambda x: x.at_us)
+        if user_ids:
+            await self._save_many(guild_id, user_ids)
+        return len(imported)
+
+    async def export_batches(
+        self, guild_id: int, size: int
+    ) -> AsyncIterator[list[Infraction]]:
+        """
+        Yield a guild's infractions, member by member, in lists of about `size`.
+        """
+        await self._ensure_guild(guild_id)
+        batch: list[Infraction] = []
+        for user_id in list(self._members[guild_id]):
+            # looked up again since the member may have been cleared while the caller awaited
+            batch.extend(self._members[guild_id].get(user_id, ()))
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    async def remove(self, infraction: Infraction) -> bool:
+        guild_id, user_id = infraction.violator.guild_id, infraction.violator.user_id
+        cached = await self.get_infraction(guild_id, user_id, infraction.id)
+        if cached is None:
+            return False
+
+        self._members[guild_id][user_id].remove(cached)
+        del self._ids[guild_id][cached.id]
+        self._uncount_warn(guild_id, cached.id, user_id)
+        self._remove_from_index(guild_id, cached)
+        await self._save(guild_id, user_id)
+        return True
+
+    async def replace(self, original: Infraction, new: Infraction) -> bool:
+        guild_id, user_id = original.violator.guild_id, original.violator.user_id
+        cached = await self.get_infraction(guild_id, user_id, original.id)
+        if cached is None:
+            return False
+
+        infractions = self._members[guild_id][user_id]
+        infractions[infractions.index(cached)] = new
+        # an edited infraction keeps its id
+        new.id = cached.id
+        self._ids[guild_id][new.id] = new
+        self._uncount_warn(guild_id, cached.id, user_id)
+        self._count_warn(guild_id, new)
+        self._remove_from_index(guild_id, cached)
+        self._add_to_index(guild_id, new)
+        await self._save(guild_id, user_id)
+        return True
+
+    async def clear(self, guild_id: int, user_id: int):
+        await self._ensure_guild(guild_id)
+        for infraction in self._members[guild_id].pop(user_id, ()):
+            del self._ids[guild_id][infraction.id]
+            self._uncount_warn(guild_id, infraction.id, user_id)
+            self._remove_from_index(guild_id, infraction)
+        await self._save(guild_id, user_id)
+
+
+class GuildSettingsCache:
+    """
+    Read-only snapshots of each guild's settings.
+
+    A snapshot is loaded on first use and replaced wholesale by `refresh`, which every settings
+    command calls after writing to config. Listeners can then check their settings without touching
+    config.
+
+    `refresh` builds new objects for the whole snapshot, so anything derived from a part of it can
+    tell it's out of date by identity, see `SnapshotCache`.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self._guilds: dict[int, Mapping[str, Any]] = {}
+
+    async def get(self, guild_id: int) -> Mapping[str, Any]:
+        try:
+            return self._guilds[guild_id]
+        except KeyError:
+            return await self.refresh(guild_id)
+
+    async def refresh(self, guild_id: int) -> Mapping[str, Any]:
+        snapshot = self._guilds[guild_id] = _freeze(
+            await self.config.guild_from_id(guild_id).all()
+        )
+        return snapshot
+
+
+class SnapshotCache(Generic[T]):
+    """
+    Values built from one part of a guild's settings snapshot, such as its compiled shorthands.
+
+    Each value remembers the mapping it was built from and is rebuilt when asked for with any
+    other one, which is the case after every settings change.
+    """
+
+    def __init__(self, build: Callable[[Mapping[str, Any]], T]):
+        self.build = build
+        self._guilds: dict[int, tuple[Mapping[str, Any], T]] = {}
+
+    def get(self, guild_id: int, source: Mapping[str, Any]) -> T:
+        cached = self._guilds.get(guild_id)
+        if cached is None or cached[0] is not source:
+            cached = self._guilds[guild_id] = (source, self.build(source))
+        return cached[1]
+
+
+class ShorthandMatcher:
+    """
+    Expands a guild's reason shorthands in one pass over the reason.
+
+    All shorthands are compiled into a single alternation, longest first, so where shorthands
+    overlap the longest one starting at the earliest position wins whatever order they were added
+    in. Replacements aren't expanded again.
+    """
+
+    __slots__ = ("shorthands", "pattern")
+
+    def __init__(self, shorthands: Mapping[str, str]):
+        self.shorthands = dict(shorthands)
+        self.pattern = (
+            re.compile(
+                "|".join(
+                    map(re.escape, sorted(self.shorthands, key=lambda x: (-len(x), x)))
+                )
+            )
+            if self.shorthands
+            else None
+        )
+
+    def expand(self, reason: str) -> str:
+        if self.pattern is None:
+            return reason
+        return self.pattern.sub(lambda m: self.shorthands[m.group()], reason)
+
+
+class WatchlistEntry(NamedTuple):
+    reason: str
+    expires_at: Optional[datetime]
+
+    @property
+    def json(self):
+        return {
+            "reason": self.reason,
+            "duration": self.expires_at.isoformat() if self.expires_at else None,
+        }
+
+    @classmethod
+    def from_json(cls, json: dict):
+        expires_at = json["duration"] and datetime.fromisoformat(json["duration"])
+        if expires_at and expires_at.tzinfo is None:
+            # older entries were saved without a timezone
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        return cls(json["reason"], expires_at or None)
+
+
+class WatchlistIndex:
+    """
+    Every guild's watchlist, held in memory and saved as one document per guild.
+
+    Entries with an expiry are also put in a deadline queue. `next_expired` sleeps until the
+    earliest one is due, so reads never have to check expiry themselves.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self._guilds: dict[int, dict[int, WatchlistEntry]] = {}
+        self._expiries: DeadlineQueue[tuple[int, int]] = DeadlineQueue()
+        self._lock = asyncio.Lock()
+        self._loaded = False
+
+    async def _ensure_loaded(self):
+        if self._loaded:
+            return
+
+        async with self._lock:
+            if self._loaded:
+                return
+
+            if not await self.config.watchlist_migrated():
+                await self._migrate()
+
+            for guild_id, data in (await self.config.custom("WATCHLIST").all()).items():
+                for user_id, entry in data.get("members", {}).items():
+                    self._put(int(guild_id), int(user_id), WatchlistEntry.from_json(entry))
+
+            self._loaded = True
+
+    async def _migrate(self):
+        # watchlist entries used to live on each member.
+        for guild_id, members in (await self.config.all_members()).items():
+            watched = {
+                str(user_id): data["watchlist"]
+                for user_id, data in members.items()
+                if data.get("watchlist")
+            }
+            if not watched:
+                continue
+
+            await self.config.custom("WATCHLIST", guild_id).members.set(watched)
+            for user_id in watched:
+                await self.config.member_from_ids(int(guild_id), int(user_id)).watchlist.clear()
+
+        await self.config.watchlist_migrated.set(True)
+
+    def _put(self, guild_id: int, user_id: int, entry: WatchlistEntry):
+        self._guilds.setdefault(guild_id, {})[user_id] = entry
+        if entry.expires_at:
+            self._expiries.schedule((guild_id, user_id), entry.expires_at.timestamp())
+        else:
+            self._expiries.discard((guild_id, user_id))
+
+    async def _save(self, guild_id: int):
+        entries = self._guilds.get(guild_id)
+        if entries:
+            await self.config.custom("WATCHLIST", guild_id).members.set(
+                {str(user_id): entry.json for user_id, entry in entries.items()}
+            )
+        else:
+            await self.config.custom("WATCHLIST", guild_id).clear()
+
+    async def get(self, guild_id: int, user_id: int) -> Optional[WatchlistEntry]:
+        await self._ensure_loaded()
+        return self._guilds.get(guild_id, {}).get(user_id)
+
+    async def all(self, guild_id: int) -> dict[int, WatchlistEntry]:
+        await self._ensure_loaded()
+        return dict(self._guilds.get(guild_id, {}))
+
+    async def add(
+        self, guild_id: int, user_id: int, reason: str, expires_at: Optional[datetime]
+    ):
+        await self._ensure_loaded()
+        self._put(guild_id, user_id, WatchlistEntry(reason, expires_at))
+        await self._save(guild_id)
+
+    async def remove(self, guild_id: int, user_id: int):
+        await self._ensure_loaded()
+        if self._guilds.get(guild_id, {}).pop(user_id, None) is not None:
+            self._expiries.discard((guild_id, user_id))
+            await self._save(guild_id)
+
+    async def clear(self, guild_id: int):
+        await self._ensure_loaded()
+        for user_id in self._guilds.pop(guild_id, {}):
+            self._expiries.discard((guild_id, user_id))
+        await self._save(guild_id)
+
+    async def next_expired(self) -> tuple[int, int]:
+        """
+        Wait until the earliest watchlist entry expires and return its guild and user ids.
+        """
+        await self._ensure_loaded()
+        return await self._expiries.next_due()
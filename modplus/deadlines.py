@@ -0,0 +1,75 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+__all__ = ("DeadlineQueue",)
+
+K = TypeVar("K", bound=Hashable)
+
+
+class DeadlineQueue(Generic[K]):
+    """
+    Keys ordered by deadline, and a wait for the earliest one to come due.
+
+    Each key has at most one deadline. Scheduling a key again moves it, and `discard` removes it.
+    Moved and removed keys are left in the heap and skipped when they reach the top. Deadlines are
+    measured with `clock`, `time.time` unless given.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._deadlines: dict[K, float] = {}
+        # (deadline, tie breaker, key), the counter keeps keys from ever being compared
+        self._heap: list[tuple[float, int, K]] = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._deadlines
+
+    def get(self, key: K) -> Optional[float]:
+        return self._deadlines.get(key)
+
+    def schedule(self, key: K, deadline: float):
+        self._deadlines[key] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), key))
+        if self._heap[0][2] == key:
+            self._wakeup.set()
+
+    def discard(self, key: K):
+        # its heap entry goes stale, waking up for it isn't needed
+        self._deadlines.pop(key, None)
+
+    def clear(self):
+        self._deadlines.clear()
+        self._heap.clear()
+
+    async def next_due(self) -> K:
+        """
+        Wait until the earliest deadline has passed, then remove its key and return it.
+        """
+        while True:
+            self._wakeup.clear()
+            delay = None
+            while self._heap:
+                deadline, _, key = self._heap[0]
+                if self._deadlines.get(key) != deadline:
+                    heapq.heappop(self._heap)
+                    continue
+
+                delay = deadline - self.clock()
+                if delay <= 0:
+                    heapq.heappop(self._heap)
+                    del self._deadlines[key]
+                    return key
+                break
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
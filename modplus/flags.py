@@ -0,0 +1,383 @@
+import asyncio
+import bisect
+import contextlib
+import json
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Iterable, NamedTuple, Optional
+import discord
+from redbot.core import Config
+
+__all__ = (
+    "FlagKey",
+    "FlagArchive",
+    "FlaggedStore",
+    "QueuedFlag",
+    "FlagQueue",
+    "FlagLocks",
+    "MessageSnapshot",
+    "MessageCache",
+)
+
+FlagKey = tuple[int, int, int]
+# (guild_id, channel_id, message_id)
+
+
+def _is_expired(
+    record: dict, now: datetime, max_age: Optional[int], keep_cleared: bool
+) -> bool:
+    if not keep_cleared and record.get("cleared"):
+        return True
+
+    return (
+        max_age is not None
+        and (now - datetime.fromisoformat(record["timestamp"])).days >= max_age
+    )
+
+
+class FlagArchive:
+    """
+    An append-only JSON lines file of FLAGGED records that were compacted out of config.
+
+    Lookups are rare (someone pressing a button on an old alert), so the file is only scanned the
+    first time one happens. After that an in-memory map of byte offsets is kept up to date.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._offsets: Optional[dict[FlagKey, int]] = None
+
+    def _build_index(self):
+        offsets: dict[FlagKey, int] = {}
+        if self.path.exists():
+            with self.path.open("rb") as f:
+                offset = f.tell()
+                while line := f.readline():
+                    offsets[tuple(json.loads(line)["key"])] = offset
+                    offset = f.tell()
+        self._offsets = offsets
+
+    def _append(self, records: list[tuple[FlagKey, dict]]):
+        with self.path.open("ab") as f:
+            for key, record in records:
+                offset = f.tell()
+                f.write(
+                    json.dumps({"key": key, **record}, separators=(",", ":")).encode() + b"\n"
+                )
+                if self._offsets is not None:
+                    self._offsets[key] = offset
+
+    def _get(self, key: FlagKey) -> Optional[dict]:
+        if self._offsets is None:
+            self._build_index()
+        if (offset := self._offsets.get(key)) is None:
+            return None
+
+        with self.path.open("rb") as f:
+            f.seek(offset)
+            record = json.loads(f.readline())
+        del record["key"]
+        return record
+
+    async def append(self, records: list[tuple[FlagKey, dict]]):
+        await asyncio.to_thread(self._append, records)
+
+    async def get(self, key: FlagKey) -> Optional[dict]:
+        return await asyncio.to_thread(self._get, key)
+
+
+class QueuedFlag(NamedTuple):
+    key: FlagKey
+    reporters: int
+    timestamp: datetime
+    author_id: int
+    alert_message: Optional[int]
+
+    @classmethod
+    def from_record(cls, key: FlagKey, record: dict) -> "QueuedFlag":
+        return cls(
+            key,
+            len(record.get("reporters", ())),
+            datetime.fromisoformat(record["timestamp"]),
+            record["author_id"],
+            record.get("alert_message"),
+        )
+
+
+class FlagQueue:
+    """
+    Each guild's uncleared flags, most reported first and newest first among equals.
+
+    A guild's flags are kept in a list sorted by priority, so updating one is a bisect and showing
+    the queue is a slice.
+    """
+
+    def __init__(self):
+        # guild_id -> (-reporters, -timestamp, key, flag), sorted
+        self._order: dict[int, list[tuple[int, float, FlagKey, QueuedFlag]]] = {}
+        self._items: dict[FlagKey, tuple[int, float, FlagKey, QueuedFlag]] = {}
+
+    @staticmethod
+    def _item(key: FlagKey, record: dict) -> tuple[int, float, FlagKey, QueuedFlag]:
+        flag = QueuedFlag.from_record(key, record)
+        return (-flag.reporters, -flag.timestamp.timestamp(), key, flag)
+
+    def load(self, records: Iterable[tuple[FlagKey, dict]]):
+        """
+        Replace the whole queue, sorting each guild once.
+        """
+        self._order.clear()
+        self._items.clear()
+        for key, record in records:
+            if not record.get("cleared"):
+                item = self._items[key] = self._item(key, record)
+                self._order.setdefault(key[0], []).append(item)
+        for items in self._order.values():
+            items.sort()
+
+    def put(self, key: FlagKey, record: dict):
+        self.discard(key)
+        if not record.get("cleared"):
+            item = self._items[key] = self._item(key, record)
+            bisect.insort(self._order.setdefault(key[0], []), item)
+
+    def discard(self, key: FlagKey):
+        if (item := self._items.pop(key, None)) is not None:
+            items = self._order[key[0]]
+            del items[bisect.bisect_left(items, item)]
+
+    def get(self, guild_id: int) -> list[QueuedFlag]:
+        return [item[-1] for item in self._order.get(guild_id, ())]
+
+
+class FlaggedStore:
+    """
+    A write-behind buffer in front of the FLAGGED custom group.
+
+    Records are kept in memory once read or created. Changes are applied to the in-memory record
+    straight away, so callers always see the latest reporters, and are written to config in batches
+    by `flush` with one write per changed record no matter how many reactions it received.
+
+    Every change is also applied to `queue`, which `load_queue` builds from one read of the
+    whole group.
+    """
+
+    def __init__(self, config: Config, archive: FlagArchive):
+        self.config = config
+        self.archive = archive
+        self.queue = FlagQueue()
+        self._queue_loaded = False
+        self._queue_lock = asyncio.Lock()
+        self._records: dict[FlagKey, dict] = {}
+        self._dirty: set[FlagKey] = set()
+
+    async def get(self, guild_id: int, channel_id: int, message_id: int) -> Optional[dict]:
+        """
+        Get the record of a flagged message, or None if it was never flagged.
+
+        The returned dict is the buffered record itself and shouldn't be mutated directly.
+        """
+        key = (guild_id, channel_id, message_id)
+        if (record := self._records.get(key)) is not None:
+            return record
+
+        record = await self.config.custom("FLAGGED", *key).all()
+        if not record:
+            # another task may have created it while we were reading config.
+            return self._records.get(key)
+
+        return self._records.setdefault(key, record)
+
+    async def load_queue(self):
+        if self._queue_loaded:
+            return
+
+        async with self._queue_lock:
+            if self._queue_loaded:
+                return
+
+            records = {
+                (int(guild_id), int(channel_id), int(message_id)): record
+                for guild_id, channels in (await self.config.custom("FLAGGED").all()).items()
+                for channel_id, messages in channels.items()
+                for message_id, record in messages.items()
+            }
+            # buffered records are newer than config and include any not written yet
+            records.update(self._records)
+            self.queue.load(records.items())
+            self._queue_loaded = True
+
+    def create(self, key: FlagKey, record: dict):
+        self._records[key] = record
+        self._dirty.add(key)
+        self.queue.put(key, record)
+
+    def update(self, key: FlagKey, **fields):
+        self._records[key].update(fields)
+        self._dirty.add(key)
+        self.queue.put(key, self._records[key])
+
+    def add_reporter(self, key: FlagKey, user_id: int) -> Optional[list[int]]:
+        """
+        Add a reporter to a flagged message and return the new list of reporters.
+
+        Returns None if the user had already reported this message.
+        """
+        record = self._records[key]
+        if user_id in record["reporters"]:
+            return None
+
+        record["reporters"] = reporters = [*record["reporters"], user_id]
+        self._dirty.add(key)
+        self.queue.put(key, record)
+        return reporters
+
+    async def flush(self):
+        dirty, self._dirty = self._dirty, set()
+        while dirty:
+            key = dirty.pop()
+            try:
+                await self.config.custom("FLAGGED", *key).set(dict(self._records[key]))
+            except Exception:
+                # keep whatever wasn't written for the next flush
+                self._dirty.update((key, *dirty))
+                raise
+
+    async def compact(self, policies: dict[int, tuple[Optional[int], bool]]) -> int:
+        """
+        Move records that fall outside their guild's retention policy into the archive.
+
+        `policies` maps guild ids to `(max_age_days, keep_cleared)`. Guilds without a policy are
+        left alone. Returns the number of records archived.
+        """
+        await self.flush()
+        now = datetime.now(timezone.utc)
+        expired: list[tuple[FlagKey, dict]] = []
+        for guild_id, channels in (await self.config.custom("FLAGGED").all()).items():
+            max_age, keep_cleared = policies.get(int(guild_id), (None, True))
+            expired.extend(
+                ((int(guild_id), int(channel_id), int(message_id)), record)
+                for channel_id, messages in channels.items()
+                for message_id, record in messages.items()
+                if _is_expired(record, now, max_age, keep_cleared)
+            )
+
+        # records changed since they were read are left for the next pass
+        expired = [(key, record) for key, record in expired if key not in self._dirty]
+        if not expired:
+            return 0
+
+        # only removed from config once the archive write went through
+        await self.archive.append(expired)
+        archived = 0
+        for key, _ in expired:
+            if key in self._dirty:
+                # changed during the write, the next pass archives the newer copy over this one.
+                continue
+            self._records.pop(key, None)
+            self.queue.discard(key)
+            await self.config.custom("FLAGGED", *key).clear()
+            archived += 1
+
+        return archived
+
+
+class _FlagLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.users = 0
+
+
+class FlagLocks:
+    """
+    A lock per flagged message, so the reactions on one message are handled one at a time while
+    different messages are handled in parallel.
+
+    A message's lock only exists while a task holds it or waits for it, so idle messages take no
+    memory.
+    """
+
+    def __init__(self):
+        self._locks: dict[FlagKey, _FlagLock] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    @contextlib.asynccontextmanager
+    async def hold(self, key: FlagKey) -> AsyncIterator[None]:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = _FlagLock()
+        entry.users += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.users -= 1
+            if not entry.users:
+                del self._locks[key]
+
+
+class MessageSnapshot(NamedTuple):
+    author_id: int
+    content: str
+    created_at: datetime
+
+
+class MessageCache:
+    """
+    What flagging needs to know about recent messages, so flagging one doesn't need a request.
+
+    Messages are added as they're sent and dropped least recently used first past `max_size`.
+    Messages that aren't cached are fetched, and concurrent fetches of the same message share one
+    request.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._messages: OrderedDict[int, MessageSnapshot] = OrderedDict()
+        self._pending: dict[int, asyncio.Task] = {}
+
+    def put(self, message: discord.Message) -> MessageSnapshot:
+        snapshot = self._messages[message.id] = MessageSnapshot(
+            message.author.id, message.content, message.created_at
+        )
+        self._messages.move_to_end(message.id)
+        while len(self._messages) > self.max_size:
+            self._messages.popitem(last=False)
+        return snapshot
+
+    def edit(self, message_id: int, content: str):
+        if (snapshot := self._messages.get(message_id)) is not None:
+            self._messages[message_id] = snapshot._replace(content=content)
+
+    def discard(self, message_id: int):
+        self._messages.pop(message_id, None)
+
+    async def _fetch(self, channel: discord.abc.Messageable, message_id: int) -> MessageSnapshot:
+        try:
+            return self.put(await channel.fetch_message(message_id))
+        finally:
+            del self._pending[message_id]
+
+    async def fetch(self, channel: discord.abc.Messageable, message_id: int) -> MessageSnapshot:
+        """
+        Get a message from the cache or from Discord. Raises what `fetch_message` raises.
+        """
+        if (snapshot := self._messages.get(message_id)) is not None:
+            self._messages.move_to_end(message_id)
+            return snapshot
+
+        task = self._pending.get(message_id)
+        if task is None:
+            task = self._pending[message_id] = asyncio.create_task(
+                self._fetch(channel, message_id)
+            )
+            # marks the exception as retrieved when every waiter was cancelled
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        # the fetch runs on its own, so any waiter, the first one too, can be cancelled without
+        # cancelling it for the others
+        return await asyncio.shield(task)
@@ -0,0 +1,121 @@
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+from redbot.core import Config
+
+from .deadlines import DeadlineQueue
+
+__all__ = ("PooledInvite", "InvitePool")
+
+
+class PooledInvite(NamedTuple):
+    expires_at: float
+    url: str
+
+
+class InvitePool:
+    """
+    Pre-made single use invites for each appeal server.
+
+    Every guild asks for a pool size for its appeal server and each server's pool is kept at the
+    largest size asked for. `pop` hands out the oldest invite that still has `min_lifetime` seconds
+    left, and `next_refill` tells the background task which pool to top up and when.
+
+    The pooled invites are live, so they're saved with `save` and taken back by `load` instead of
+    being left unused every time the cog reloads.
+    """
+
+    def __init__(self, config: Config, max_age: int, min_lifetime: int):
+        self.config = config
+        self.max_age = max_age
+        self.min_lifetime = min_lifetime
+        # appeal server id -> invites, oldest first
+        self._invites: dict[int, deque[PooledInvite]] = {}
+        # guild id -> (appeal server id, pool size)
+        self._demands: dict[int, tuple[int, int]] = {}
+        # appeal server id -> when its pool is next checked
+        self._checks: DeadlineQueue[int] = DeadlineQueue()
+        # appeal server id -> time.time() before which it isn't refilled again
+        self._deferred: dict[int, float] = {}
+
+    def _check_soon(self, server_id: int):
+        self._checks.schedule(server_id, self._deferred.get(server_id, 0))
+
+    def configure(self, guild_id: int, server_id: Optional[int], size: int):
+        old = self._demands.get(guild_id)
+        if server_id and size:
+            self._demands[guild_id] = (server_id, size)
+        else:
+            self._demands.pop(guild_id, None)
+        for server in (old and old[0], server_id):
+            if server:
+                self._check_soon(server)
+
+    def target(self, server_id: int) -> int:
+        return max((size for s, size in self._demands.values() if s == server_id), default=0)
+
+    def _prune(self, server_id: int) -> deque[PooledInvite]:
+        invites = self._invites.setdefault(server_id, deque())
+        cutoff = time.time() + self.min_lifetime
+        while invites and invites[0].expires_at < cutoff:
+            invites.popleft()
+        return invites
+
+    def pop(self, server_id: int) -> Optional[str]:
+        invites = self._prune(server_id)
+        self._check_soon(server_id)
+        return invites.popleft().url if invites else None
+
+    def put(self, server_id: int, url: str, created_at: float):
+        self._invites.setdefault(server_id, deque()).append(
+            PooledInvite(created_at + self.max_age, url)
+        )
+
+    async def load(self):
+        for server_id, saved in (await self.config.appeal_invites()).items():
+            server_id = int(server_id)
+            invites = self._invites.get(server_id, ())
+            self._invites[server_id] = deque(
+                sorted({*invites, *(PooledInvite(*invite) for invite in saved)})
+            )
+            self._check_soon(server_id)
+
+    async def save(self):
+        await self.config.appeal_invites.set(
+            {
+                str(server_id): [list(invite) for invite in invites]
+                for server_id, invites in self._invites.items()
+                if invites
+            }
+        )
+
+    def defer(self, server_id: int, seconds: float):
+        """
+        Skip refilling a server for a while, e.g. after creating an invite failed.
+        """
+        self._deferred[server_id] = time.time() + seconds
+        self._checks.schedule(server_id, self._deferred[server_id])
+
+    async def next_refill(self) -> tuple[int, int]:
+        """
+        Wait until a pool needs invites and return its server id and how many it's missing.
+        """
+        while True:
+            server_id = await self._checks.next_due()
+            self._deferred.pop(server_id, None)
+            target = self.target(server_id)
+            if not target:
+                # no guild uses this appeal server anymore, the invites just expire unused.
+                self._invites.pop(server_id, None)
+                continue
+
+            invites = self._prune(server_id)
+            missing = target - len(invites)
+            if missing > 0:
+                # checked again right after the refill, unless it's deferred
+                self._check_soon(server_id)
+                return server_id, missing
+
+            if invites:
+                # the oldest invite is the next to fall out of the pool
+                self._checks.schedule(server_id, invites[0].expires_at - self.min_lifetime)
@@ -1,23 +1,116 @@
+import asyncio
+import itertools
+import logging
+import re
+import time
 import discord
 from redbot.core import commands, Config
 from redbot.core.bot import Red
-from typing import Literal, Optional, Union
-from .models import ServerMember, Infraction, InfractionConverter, InfractionDetails
+from redbot.core.data_manager import cog_data_path
+from pathlib import Path
+from typing import Any, Literal, Mapping, Optional, Union
+from .models import (
+    ServerMember,
+    MemberRef,
+    Infraction,
+    InfractionType,
+    InfractionConverter,
+    InfractionDetails,
+    InfractionSearchFlags,
+    INFRACTION_TYPES,
+    EPOCH,
+    MICROSECOND,
+)
 from datetime import datetime, timedelta, timezone
-from .views import YesOrNoView, InfractionView, InfractionPagination, PaginationView, FlaggingView
+from .views import (
+    YesOrNoView,
+    InfractionView,
+    InfractionPagination,
+    PaginationView,
+    PageSource,
+    FlaggingView,
+)
 from .tagscript import process_tagscript
+from .cache import (
+    InfractionCache,
+    GuildSettingsCache,
+    SnapshotCache,
+    ShorthandMatcher,
+    WatchlistEntry,
+    WatchlistIndex,
+)
+from .scheduler import Expiry, ExpiryScheduler
+from .flags import FlagArchive, FlaggedStore, FlagKey, FlagLocks, MessageCache
+from .store import ColumnarInfractionStore
+from .automod import AutomodAction, AutomodRules, AutomodWindows
+from .batching import LogBatch, LogBatcher
+from .invites import InvitePool
+from .ratelimit import CooldownLimiter
+from .transfer import TransferFormat, format_for, read_records, to_record, write_records
 import TagScriptEngine as tse
 from discord.ext import tasks
 from redbot.core.utils import chat_formatting as cf
-from .utils import timedelta_converter, EmojiConverter, group_embeds_by_fields
-from cachetools import TTLCache
+from .utils import timedelta_converter, EmojiConverter
+
+log = logging.getLogger("red.jakey.modplus")
+
+FLAG_FLUSH_INTERVAL = 5
+# seconds between writes of buffered FLAGGED records
+
+INFRACTION_FLUSH_INTERVAL = 10
+# seconds between writes of buffered infractions, only used by the columnar backend
+
+MASS_ACTION_CONCURRENCY = 5
+# requests in flight at once per rate limit bucket (DMs, moderation actions) for mass commands
+
+APPEAL_INVITE_MAX_AGE = 48 * 60 * 60
+# seconds an appeal invite stays valid
+
+APPEAL_INVITE_MIN_LIFETIME = 60 * 60
+# pooled invites with less than this many seconds left aren't handed out
+
+AUTOMOD_TRACKED_MEMBERS = 10_000
+# members whose recent infractions and flags are kept for window rules
+
+FLAG_COOLDOWN_TRACKED_USERS = 5_000
+# users per guild whose flagging cooldown is remembered, the longest idle are forgotten first
+
+FLAG_MESSAGE_CACHE_SIZE = 10_000
+# recent messages kept from guilds with flagging set up, so flagging them needs no request
+
+TRANSFER_BATCH_SIZE = 500
+# infractions read or written at a time by export and import, keeps memory use flat
+
+USER_ID_RE = re.compile(r"\b\d{15,20}\b")
+# user ids in files attached to mass commands
 
 FLAGGED_MESSAGE = {}
 # { guild_id: { channel_id: { message_id: { author_id: int, content: int, timestamp: str, alert_message: int, cleared: bool, reporters: list[int], flagged_by: int } } } }
 
+GLOBAL_DEFAULTS = {
+    "expiries_migrated": False,
+    "watchlist_migrated": False,
+    "infractions_migrated": False,
+    "infraction_backend": "config",
+    "appeal_invites": {},
+}
+# appeal_invites: { appeal server id: [[expires_at, url], ...] }, the pooled appeal invites
+
 MEMBER_DEFAULTS = {"infractions": [], "watchlist": None}
-# infractions: list[Infraction]
-# watchlist: {duration: datetime | None, reason: str}
+# infractions, watchlist: only read to migrate old data into INFRACTIONS and WATCHLIST
+
+INFRACTIONS_DEFAULTS = {"members": {}}
+# members: { user_id: list[Infraction] }, used by the config infraction backend
+
+WATCHLIST_DEFAULTS = {"members": {}}
+# members: { user_id: {duration: iso datetime | None, reason: str} }
+
+INFRACTION_IDS_DEFAULTS = {"last": 0}
+# last: the last infraction id handed out in the guild
+
+EXPIRIES_DEFAULTS = {"deadline": None, "user_id": None, "attempts": 0}
+# one entry per pending tempban, keyed by guild id and infraction id
+# deadline: unix timestamp the tempban ends at, attempts: failed attempts to lift it
 
 GUILD_DEFAULTS = {
     "reason_sh": {},
@@ -39,6 +132,7 @@ GUILD_DEFAULTS = {
         "{if({dms_open}):Yes|No, user might have dms closed.}\n}"
     ),
     "appeal_server": None,
+    "appeal_pool_size": 5,
     "dm_message": (
         "{stop({type}==mute)}\n"
         "{=(infrom):{if({any({type}==ban|{type}==kick|{type}==tempban)}):from|in}}\n"
@@ -63,6 +157,7 @@ GUILD_DEFAULTS = {
         "**DM'ed?**\n"
         "{if({dms_open}):Yes|No, user might have dms closed.}\n}"
     ),
+    "log_batch_window": None,
     "watchlist": {
         "channel": None,
         "notify": False,
@@ -74,6 +169,8 @@ GUILD_DEFAULTS = {
         "ping_threshold": 4,
         "mod_role": None,
         "cooldown": 300,
+        "retention_days": None,
+        "keep_cleared": True,
     },
 }
 
@@ -93,18 +190,78 @@ class ModPlus(commands.Cog):
 
         self.config.register_member(**MEMBER_DEFAULTS)
         self.config.register_guild(**GUILD_DEFAULTS)
+        self.config.register_global(**GLOBAL_DEFAULTS)
 
         self.config.init_custom("FLAGGED", 3)
+        self.config.init_custom("INFRACTIONS", 1)
+        self.config.register_custom("INFRACTIONS", **INFRACTIONS_DEFAULTS)
+        self.config.init_custom("WATCHLIST", 1)
+        self.config.register_custom("WATCHLIST", **WATCHLIST_DEFAULTS)
+        self.config.init_custom("INFRACTION_IDS", 1)
+        self.config.register_custom("INFRACTION_IDS", **INFRACTION_IDS_DEFAULTS)
+        self.config.init_custom("EXPIRIES", 2)
+        self.config.register_custom("EXPIRIES", **EXPIRIES_DEFAULTS)
+
+        self.expiry_scheduler = ExpiryScheduler(self.config)
+        self.infraction_cache = InfractionCache(
+            self.config,
+            ColumnarInfractionStore(cog_data_path(self) / "infractions"),
+            self.expiry_scheduler,
+        )
+        self.settings_cache = GuildSettingsCache(self.config)
+        self.shorthand_cache = SnapshotCache(ShorthandMatcher)
+        self.automod_cache = SnapshotCache(AutomodRules)
+        self.automod_windows = AutomodWindows(AUTOMOD_TRACKED_MEMBERS)
+        self.watchlist_index = WatchlistIndex(self.config)
+        self.flag_store = FlaggedStore(
+            self.config, FlagArchive(cog_data_path(self) / "flagged_archive.jsonl")
+        )
 
-        self.cooldown_cache: dict[int, TTLCache] = {}
+        self.log_batcher = LogBatcher()
+        self.invite_pool = InvitePool(
+            self.config, APPEAL_INVITE_MAX_AGE, APPEAL_INVITE_MIN_LIFETIME
+        )
+        self.flag_cooldowns = CooldownLimiter(FLAG_COOLDOWN_TRACKED_USERS)
+        self.flag_messages = MessageCache(FLAG_MESSAGE_CACHE_SIZE)
+        self.flag_locks = FlagLocks()
 
         self.flagging_view = FlaggingView(self.bot)
         self._update_view()
 
         self.unban_task = self.remove_tempbans.start()
-
-    def cog_unload(self):
+        self.watchlist_task = self.remove_expired_watchlist.start()
+        self.flag_flush_task = self.flush_flags.start()
+        self.flag_compact_task = self.compact_flags.start()
+        self.infraction_flush_task = self.flush_infractions.start()
+        self.log_batch_task = self.send_log_batches.start()
+        self.invite_refill_task = self.refill_appeal_invites.start()
+
+    async def cog_unload(self):
         self.unban_task.cancel()
+        self.watchlist_task.cancel()
+        self.flag_flush_task.cancel()
+        self.flag_compact_task.cancel()
+        self.infraction_flush_task.cancel()
+        self.log_batch_task.cancel()
+        self.invite_refill_task.cancel()
+        # each step is on its own, one failing mustn't lose what the others still have to save
+        try:
+            await self.flag_store.flush()
+        except Exception:
+            log.exception("Failed to save flagged messages on unload")
+        try:
+            await self.infraction_cache.flush()
+        except Exception:
+            log.exception("Failed to save infractions on unload")
+        try:
+            await self.invite_pool.save()
+        except Exception:
+            log.exception("Failed to save the appeal invite pool on unload")
+        for batch in self.log_batcher.pop_all():
+            try:
+                await self._send_log_batch(batch)
+            except Exception:
+                log.exception("Failed to send batched log messages on unload")
 
     def _update_view(self):
         for view in filter(
@@ -126,30 +283,21 @@ class ModPlus(commands.Cog):
 
     # <--- Helpers --->
 
-    async def _get_watchlist(
-        self, guild_id: int
-    ) -> dict[int, dict[str, Union[str, datetime, None]]]:
-        guild = self.bot.get_guild(guild_id)
-        return dict(
-            [
-                (member_id, await self._get_watchlist_status(guild_id, member_id))
-                for member_id, _ in filter(
-                    lambda x: x[1]["watchlist"] is not None,
-                    (await self.config.all_members(guild)).items(),
-                )
-            ]
+    async def _settings_changed(self, guild: discord.Guild):
+        # the only thing settings commands need to call after a write. Caches built from the
+        # snapshot (SnapshotCache) rebuild themselves once they see the new one.
+        settings = await self.settings_cache.refresh(guild.id)
+        self.invite_pool.configure(
+            guild.id, settings["appeal_server"], settings["appeal_pool_size"]
         )
 
-    async def _get_watchlist_status(self, guild_id: int, user_id: int):
-        watchlist = await self.config.member_from_ids(guild_id, user_id).watchlist()
-        if (
-            watchlist
-            and watchlist["duration"]
-            and datetime.fromisoformat(watchlist["duration"]) < datetime.utcnow()
-        ):
-            await self._remove_from_watchlist(guild_id, user_id)
-            return None
-        return watchlist
+    async def _get_watchlist(self, guild_id: int) -> dict[int, WatchlistEntry]:
+        return await self.watchlist_index.all(guild_id)
+
+    async def _get_watchlist_status(
+        self, guild_id: int, user_id: int
+    ) -> Optional[WatchlistEntry]:
+        return await self.watchlist_index.get(guild_id, user_id)
 
     async def _add_to_watchlist(
         self,
@@ -158,40 +306,26 @@ class ModPlus(commands.Cog):
         reason: str,
         duration: Union[datetime, None],
     ):
-        await self.config.member_from_ids(guild_id, user_id).watchlist.set(
-            {"reason": reason, "duration": duration.isoformat() if duration else None}
-        )
+        await self.watchlist_index.add(guild_id, user_id, reason, duration)
 
     async def _remove_from_watchlist(self, guild_id: int, user_id: int):
-        await self.config.member_from_ids(guild_id, user_id).watchlist.clear()
+        await self.watchlist_index.remove(guild_id, user_id)
 
     async def _clear_watchlist(self, guild_id: int):
-        for member in (await self.config.all_members()).get(guild_id, {}):
-            await self.config.member_from_ids(guild_id, member).watchlist.clear()
+        await self.watchlist_index.clear(guild_id)
 
-    async def _notify_watchlist_of_infraction(self, ctx: commands.Context, infraction: Infraction):
-        wl_channel_id = await self.config.guild(ctx.guild).watchlist.channel()
-        wl_notify = await self.config.guild(ctx.guild).watchlist.notify()
-        wl_channel = ctx.guild.get_channel(wl_channel_id)
-        wl_message = await self.config.guild(ctx.guild).watchlist.infraction_message()
+    async def _notify_watchlist_of_infraction(
+        self, guild: discord.Guild, settings: dict, seeds: dict
+    ):
+        wl_channel_id = settings["watchlist"]["channel"]
+        wl_notify = settings["watchlist"]["notify"]
+        wl_channel = guild.get_channel(wl_channel_id)
+        wl_message = settings["watchlist"]["infraction_message"]
 
         if not all((wl_channel_id, wl_channel, wl_notify, wl_message)):
             return
 
-        kwargs = process_tagscript(
-            wl_message,
-            {
-                "server": tse.GuildAdapter(ctx.guild),
-                "violator": tse.MemberAdapter(ctx.guild.get_member(infraction.violator.user_id)),
-                "issuer": tse.MemberAdapter(ctx.guild.get_member(infraction.issuer_id)),
-                "reason": tse.StringAdapter(infraction.reason),
-                "id": tse.StringAdapter(str(infraction.id)),
-                "type": tse.StringAdapter(infraction.type.value),
-                "duration": tse.IntAdapter(infraction.duration.total_seconds())
-                if infraction.duration
-                else tse.StringAdapter("Permanent"),
-            },
-        )
+        kwargs = process_tagscript(wl_message, {**seeds})
 
         if not kwargs:
             return
@@ -262,18 +396,18 @@ class ModPlus(commands.Cog):
             )
             .add_field(
                 name="Date Issued",
-                value=f"<t:{int(infraction.at.timestamp())}:R>",
+                value=f"<t:{infraction.timestamp}:R>",
                 inline=False,
             )
             .add_field(
                 name="Expired?",
                 value=(
                     (
-                        f"Expires at <t:{int(infraction.lasts_until.timestamp())}:R>"
+                        f"Expires at <t:{infraction.expires_at}:R>"
                         if not infraction.expired
                         else "Already expired"
                     )
-                    if infraction.duration
+                    if infraction.duration_us
                     else "Never expires"
                 ),
             )
@@ -290,146 +424,98 @@ class ModPlus(commands.Cog):
         )
 
     async def _get_infraction(
-        self, guild_id: int, user_id: int, infraction_id: int
+        self, guild_id: int, user_id: int, infraction_id: str
     ) -> Optional[Infraction]:
-        return next(
-            filter(
-                lambda x: x.id == infraction_id, await self._get_infractions(guild_id, user_id)
-            ),
-            None,
-        )
+        return await self.infraction_cache.get_infraction(guild_id, user_id, infraction_id)
 
     async def _get_infractions(self, guild_id: int, user_id: int) -> list[Infraction]:
-        sm = ServerMember(guild_id, user_id, [], {})
-        infractions = await self.config.member_from_ids(guild_id, user_id).infractions()
-        return list(
-            map(
-                lambda x: (inf := Infraction.from_json(x, sm), sm.infractions.append(inf))[0],
-                infractions,
-            )
-        )
+        return await self.infraction_cache.get_infractions(guild_id, user_id)
 
     async def _add_infraction(self, infraction: Infraction) -> Infraction:
-        async with self.config.member_from_ids(
-            infraction.violator.guild_id, infraction.violator.user_id
-        ).infractions() as infractions:
-            infractions.append(infraction.json)
-
+        await self.infraction_cache.add(infraction)
         return infraction
 
     async def _remove_infraction(self, infraction: Infraction) -> bool:
-        infraction = await self._get_infraction(
-            infraction.violator.guild_id, infraction.violator.user_id, infraction.id
-        )
-        if not infraction:
-            return False
-
-        async with self.config.member_from_ids(
-            infraction.violator.guild_id, infraction.violator.user_id
-        ).infractions() as infractions:
-            infractions.remove(next(filter(lambda x: x["id"] == infraction.id, infractions)))
-
-        return True
+        return await self.infraction_cache.remove(infraction)
 
     async def _clear_infractions(self, guild_id: int, user_id: int) -> bool:
-        async with self.config.member_from_ids(guild_id, user_id).infractions() as infractions:
-            infractions.clear()
-
+        await self.infraction_cache.clear(guild_id, user_id)
         return True
 
     async def _modify_infraction(
         self, original: Infraction, new: Infraction
     ) -> Union[Infraction, bool]:
-        infraction = await self._get_infraction(
-            original.violator.guild_id, original.violator.user_id, original.id
-        )
-
-        if not infraction:
+        if not await self.infraction_cache.replace(original, new):
             return False
 
-        async with self.config.member_from_ids(
-            infraction.violator.guild_id, infraction.violator.user_id
-        ).infractions() as infractions:
-            infractions.remove(next(filter(lambda x: x["id"] == infraction.id, infraction.json)))
-            infractions.append(new.json)
+        return new
 
     async def _warn_infraction_count(self, guild_id: int, user_id: int) -> int:
-        return len(
-            list(
-                filter(
-                    lambda x: x.type.value == "warn" and not x.expired,
-                    await self._get_infractions(guild_id, user_id),
-                )
-            )
-        )
+        return await self.infraction_cache.active_warns(guild_id, user_id)
+
+    def _infraction_seeds(self, guild: discord.Guild, infraction: Infraction) -> dict:
+        return {
+            "server": tse.GuildAdapter(guild),
+            "violator": tse.MemberAdapter(
+                guild.get_member(infraction.violator.user_id)
+                or self.bot.get_user(infraction.violator.user_id)
+            ),
+            "issuer": tse.MemberAdapter(
+                guild.get_member(infraction.issuer_id) or self.bot.get_user(infraction.issuer_id)
+            ),
+            "reason": tse.StringAdapter(infraction.reason),
+            "id": tse.StringAdapter(str(infraction.id)),
+            "type": tse.StringAdapter(infraction.type.value),
+            "duration": tse.IntAdapter(infraction.duration.total_seconds())
+            if infraction.duration
+            else tse.StringAdapter("Permanent"),
+        }
+
+    async def _run_sinks(self, *coros):
+        # one failing sink shouldn't stop the others from sending.
+        for result in await asyncio.gather(*coros, return_exceptions=True):
+            if isinstance(result, Exception):
+                log.error("Failed to send an infraction message", exc_info=result)
 
-    async def _log_infraction(self, infraction: Infraction, dms_open: bool):
-        log_channel = await self.config.guild_from_id(infraction.violator.guild_id).log_channel()
+    async def _log_infraction(
+        self, guild: discord.Guild, settings: dict, seeds: dict, dms_open: bool
+    ):
+        log_channel = settings["log_channel"]
         if not log_channel:
             return
 
-        guild = self.bot.get_guild(infraction.violator.guild_id)
-
         chan = guild.get_channel(log_channel)
         if not chan:
             return
 
-        log_message = await self.config.guild_from_id(infraction.violator.guild_id).log_message()
+        log_message = settings["log_message"]
         if not log_message:
             return
 
         kwargs = process_tagscript(
             log_message,
-            {
-                "server": tse.GuildAdapter(guild),
-                "violator": tse.MemberAdapter(
-                    guild.get_member(infraction.violator.user_id)
-                    or self.bot.get_user(infraction.violator.user_id)
-                ),
-                "issuer": tse.MemberAdapter(
-                    guild.get_member(infraction.issuer_id)
-                    or self.bot.get_user(infraction.issuer_id)
-                ),
-                "reason": tse.StringAdapter(infraction.reason),
-                "id": tse.StringAdapter(str(infraction.id)),
-                "type": tse.StringAdapter(infraction.type.value),
-                "duration": tse.IntAdapter(infraction.duration.total_seconds())
-                if infraction.duration
-                else tse.StringAdapter("Permanent"),
-                "dms_open": tse.StringAdapter(dms_open),
-            },
+            {**seeds, "dms_open": tse.StringAdapter(dms_open)},
         )
 
         if not kwargs:
             return
 
+        if window := settings["log_batch_window"]:
+            self.log_batcher.add(guild.id, chan, kwargs, window)
+            return
+
         await chan.send(**kwargs)
 
     async def _channel_message(
-        self, channel: discord.TextChannel, infraction: Infraction, dms_open: bool
+        self, channel: discord.TextChannel, settings: dict, seeds: dict, dms_open: bool
     ):
-        message = await self.config.guild_from_id(infraction.violator.guild_id).channel_message()
-        guild = self.bot.get_guild(infraction.violator.guild_id)
+        message = settings["channel_message"]
+        if not message:
+            return
+
         kwargs = process_tagscript(
             message,
-            {
-                "server": tse.GuildAdapter(guild),
-                "violator": tse.MemberAdapter(
-                    guild.get_member(infraction.violator.user_id)
-                    or self.bot.get_user(infraction.violator.user_id)
-                ),
-                "issuer": tse.MemberAdapter(
-                    guild.get_member(infraction.issuer_id)
-                    or self.bot.get_user(infraction.issuer_id)
-                ),
-                "reason": tse.StringAdapter(infraction.reason),
-                "id": tse.StringAdapter(str(infraction.id)),
-                "type": tse.StringAdapter(infraction.type.value),
-                "duration": tse.IntAdapter(infraction.duration.total_seconds())
-                if infraction.duration
-                else tse.StringAdapter("Permanent"),
-                "dms_open": tse.StringAdapter(dms_open),
-            },
+            {**seeds, "dms_open": tse.StringAdapter(dms_open)},
         )
 
         if not kwargs:
@@ -438,35 +524,37 @@ class ModPlus(commands.Cog):
         await channel.send(**kwargs)
 
     async def _dm_message(
-        self, user: discord.Member, infraction: Infraction, include_invite: bool = True
+        self,
+        user: discord.Member,
+        infraction: Infraction,
+        settings: dict,
+        seeds: dict,
+        include_invite: bool = True,
     ):
-        message = await self.config.guild_from_id(infraction.violator.guild_id).dm_message()
-        guild = self.bot.get_guild(infraction.violator.guild_id)
+        message = settings["dm_message"]
+        if not message:
+            return False
 
         invite = ""
         if infraction.type.value in ("ban", "tempban", "kick") and include_invite:
-            appeal = await self.config.guild_from_id(infraction.violator.guild_id).appeal_server()
+            appeal = settings["appeal_server"]
             if appeal:
-                server = self.bot.get_guild(appeal)
-                if server:
-                    invite = await server.channels[0].create_invite(
-                        max_uses=1, max_age=48 * 60 * 60, reason=f"Infraction Appeal for {user}"
-                    )
+                invite = self.invite_pool.pop(appeal)
+                if invite is not None:
+                    await self.invite_pool.save()
+                elif (server := self.bot.get_guild(appeal)):
+                    # the pool ran dry, fall back to making one now.
+                    try:
+                        invite = await self._create_appeal_invite(
+                            server, f"Infraction Appeal for {user}"
+                        )
+                    except discord.HTTPException:
+                        log.debug("Couldn't create an appeal invite in %s", appeal, exc_info=True)
+                invite = str(invite or "")
 
         kwargs = process_tagscript(
             message,
-            {
-                "server": tse.GuildAdapter(guild),
-                "invite": tse.StringAdapter(invite),
-                "violator": tse.MemberAdapter(guild.get_member(infraction.violator.user_id)),
-                "issuer": tse.MemberAdapter(guild.get_member(infraction.issuer_id)),
-                "reason": tse.StringAdapter(infraction.reason),
-                "id": tse.StringAdapter(str(infraction.id)),
-                "type": tse.StringAdapter(infraction.type.value),
-                "duration": tse.IntAdapter(infraction.duration.total_seconds())
-                if infraction.duration
-                else tse.StringAdapter("Permanent"),
-            },
+            {**seeds, "invite": tse.StringAdapter(invite)},
         )
 
         if not kwargs:
@@ -481,32 +569,111 @@ class ModPlus(commands.Cog):
         else:
             return True
 
+    async def _create_appeal_invite(
+        self, server: discord.Guild, reason: str
+    ) -> Optional[discord.Invite]:
+        channel = next(
+            (c for c in server.text_channels if c.permissions_for(server.me).create_instant_invite),
+            None,
+        )
+        if channel is None:
+            return None
+
+        return await channel.create_invite(
+            max_uses=1, max_age=APPEAL_INVITE_MAX_AGE, unique=True, reason=reason
+        )
+
     async def _appropriate_reason(self, guild_id: int, reason: str):
-        shorthands = await self.config.guild_from_id(guild_id).reason_sh()
-        for shorthand, replacement in shorthands.items():
-            reason = reason.replace(shorthand, replacement)
+        shorthands = (await self.settings_cache.get(guild_id))["reason_sh"]
+        return self.shorthand_cache.get(guild_id, shorthands).expand(reason)
 
-        return reason
+    async def _check_automod(
+        self, guild: discord.Guild, channel: discord.abc.Messageable, user_id: int, kind: str
+    ):
+        """
+        Run automod for a new infraction of type `kind`, or a new flag when `kind` is "flag".
 
-    async def _check_automod(self, ctx: commands.Context, user: discord.Member):
-        count = await self._warn_infraction_count(user.guild.id, user.id)
+        Window rules are checked first, then for a new warn the active warn thresholds. Only one
+        action is taken per event.
+        """
+        member = guild.get_member(user_id)
+        if member is None:
+            # they were kicked or banned, there's nothing left to escalate.
+            return
 
-        am_counts = await self.config.guild(user.guild).automod()
+        settings = await self.settings_cache.get(guild.id)
+        rules = self.automod_cache.get(guild.id, settings["automod"])
+
+        if rules.windows:
+            kinds = ("flag",) if kind == "flag" else (kind, "infraction")
+            rule = self.automod_windows.record(guild.id, user_id, kinds, rules)
+            if rule is not None:
+                return await self._automod_action(
+                    guild,
+                    channel,
+                    member,
+                    rule.action,
+                    f"Automod action for {rule.count} {rule.kind}s within "
+                    f"{cf.humanize_timedelta(seconds=rule.seconds)}",
+                )
 
-        try:
-            action = am_counts[count]
+        if kind != "warn" or not rules.thresholds:
+            return
 
-        except KeyError:
+        count = await self._warn_infraction_count(guild.id, user_id)
+        action = rules.for_warns(count)
+        if action is not None:
+            await self._automod_action(
+                guild, channel, member, action, f"Automod action for {count} infractions"
+            )
+
+    async def _automod_action(
+        self,
+        guild: discord.Guild,
+        channel: discord.abc.Messageable,
+        member: discord.Member,
+        action: AutomodAction,
+        reason: str,
+    ):
+        if member == guild.owner or guild.me.top_role <= member.top_role:
+            log.info(
+                "Automod can't %s %s in %s, their role is too high", action.command, member, guild
+            )
             return
 
-        else:
-            kwargs = dict(ctx=ctx, user=user, reason=f"Automod action for {count} infractions")
-            if len(a := action.split()) > 1:
-                action = a[0]
-                duration = timedelta(seconds=int(a[1]))
-                kwargs.update(until=duration)
+        duration = action.duration if action.command != "kick" else None
+        if action.command == "mute" and not duration:
+            log.info("Automod can't mute %s in %s without a duration", member, guild)
+            return
+
+        type = InfractionType.TEMPBAN if action.command == "ban" and duration else None
+        sm = await ServerMember.from_member(self, member)
+        infraction = Infraction(
+            type=type or INFRACTION_TYPES[action.command],
+            reason=reason,
+            at=datetime.now(timezone.utc),
+            duration=duration,
+            violator=sm.ref,
+            issuer_id=guild.me.id,
+        )
+        sm.infractions.append(infraction)
+        # automod's own infractions don't count towards automod, or a threshold would action
+        # the member again and again.
+        await self._record_infraction(
+            guild, channel, member, sm, infraction, True, run_automod=False
+        )
 
-            await getattr(self, action)(**kwargs)
+        try:
+            if action.command == "ban":
+                await member.ban(reason=reason)
+            elif action.command == "kick":
+                await member.kick(reason=reason)
+            elif action.command == "mute":
+                await member.timeout(duration, reason=reason)
+        except discord.HTTPException:
+            log.warning("Automod couldn't %s %s in %s", action.command, member, guild)
+            # nothing was done, so there's nothing to keep on record
+            await self._remove_infraction(infraction)
 
     async def _validate_action(self, ctx: commands.Context, user: discord.Member, action: str):
         return all(
@@ -530,48 +697,340 @@ class ModPlus(commands.Cog):
             ]
         )
 
-    # <--- Tempban Expiry loop --->
+    # <--- Mass moderation helpers --->
+
+    async def _mass_targets(self, ctx: commands.Context, user_ids: list[int]) -> list[int]:
+        # ids given as arguments first, then any from attached files, without duplicates.
+        targets = dict.fromkeys(user_ids)
+        for attachment in ctx.message.attachments:
+            content = (await attachment.read()).decode("utf-8", errors="ignore")
+            targets.update(dict.fromkeys(map(int, USER_ID_RE.findall(content))))
+        return list(targets)
+
+    def _mass_mentions(self, user_ids: list[int], limit: int = 1024) -> str:
+        text = ""
+        for index, user_id in enumerate(user_ids):
+            mention = f"<@{user_id}>"
+            if len(text) + len(mention) + 30 > limit:
+                return f"{text}and {len(user_ids) - index} more"
+            text += f"{mention} "
+        return text or "None"
+
+    async def _mass_action(
+        self,
+        ctx: commands.Context,
+        type: InfractionType,
+        user_ids: list[int],
+        duration: Optional[timedelta],
+        reason: str,
+        apply=None,
+        require_member: bool = True,
+    ):
+        """
+        Record and carry out one action against many users.
 
-    @tasks.loop(hours=1)
-    async def remove_tempbans(self):
-        guilds = await self.config.all_members()
+        Every infraction is stored with a single write before any API call is made, like the
+        single user commands do. DMs and the action itself then go through two bounded queues, one
+        per rate limit bucket, so discord.py's bucket handling isn't flooded and one 429 doesn't
+        hold up hundreds of tasks. The log channel gets one summary instead of a message per user.
+        """
+        guild = ctx.guild
+        user_ids = await self._mass_targets(ctx, user_ids)
+        if not user_ids:
+            return await ctx.send("You need to give at least one user or attach a file of IDs.")
+
+        reason = await self._appropriate_reason(guild.id, reason)
+        settings = await self.settings_cache.get(guild.id)
+        now = datetime.now(timezone.utc)
 
-        for guild_id, guild_data in guilds.items():
-            guild = self.bot.get_guild(guild_id)
-            if not guild:
+        skipped: list[int] = []
+        targets: list[tuple[Union[discord.Member, discord.Object], Infraction]] = []
+        for user_id in user_ids:
+            member = guild.get_member(user_id)
+            if member is None and require_member:
+                skipped.append(user_id)
+                continue
+            if member is not None and not await self._validate_action(ctx, member, type.value):
+                skipped.append(user_id)
                 continue
 
-            members_to_unban = filter(
-                lambda x: (
-                    lambda mid, data: next(
-                        filter(
-                            lambda infraction: infraction["type"] == "tempban"
-                            and infraction["duration"] is not None
-                            and (
-                                datetime.fromisoformat(infraction["at"])
-                                + timedelta(seconds=infraction["duration"])
-                            )
-                            < datetime.now(tz=timezone.utc)
-                            and guild.get_member(mid) is None,
-                            data["infractions"],
-                        ),
-                        None,
-                    )
-                    is not None
-                )(*x),
-                guild_data.items(),
+            infraction = Infraction(
+                type=type,
+                reason=reason,
+                at=now,
+                duration=duration,
+                violator=MemberRef(guild.id, user_id),
+                issuer_id=ctx.author.id,
+            )
+            targets.append((member or discord.Object(id=user_id), infraction))
+
+        if not targets:
+            return await ctx.send("None of those users can be actioned.")
+
+        async with ctx.typing():
+            await self.infraction_cache.add_many(guild.id, [inf for _, inf in targets])
+            if type is InfractionType.TEMPBAN:
+                await self.expiry_scheduler.schedule_many(
+                    [
+                        Expiry(inf.expires_at, guild.id, inf.violator.user_id, inf.id)
+                        for _, inf in targets
+                    ]
+                )
+
+            dm_queue = asyncio.Semaphore(MASS_ACTION_CONCURRENCY)
+            action_queue = asyncio.Semaphore(MASS_ACTION_CONCURRENCY)
+
+            async def run(target, infraction: Infraction):
+                if isinstance(target, discord.Member):
+                    async with dm_queue:
+                        await self._dm_message(
+                            target,
+                            infraction,
+                            settings,
+                            self._infraction_seeds(guild, infraction),
+                            include_invite=type in (InfractionType.BAN, InfractionType.TEMPBAN),
+                        )
+                if apply is not None:
+                    async with action_queue:
+                        await apply(target, reason)
+
+            results = await asyncio.gather(
+                *(run(target, inf) for target, inf in targets), return_exceptions=True
             )
 
-            for member_id, _ in members_to_unban:
-                try:
-                    await guild.unban(discord.Object(id=int(member_id)), reason="Tempban expired")
+        done, failed = [], []
+        for (target, _), result in zip(targets, results):
+            if isinstance(result, Exception):
+                log.debug("Mass %s failed for %s", type.value, target.id, exc_info=result)
+                failed.append(target.id)
+            else:
+                done.append(target.id)
+
+        duration_text = cf.humanize_timedelta(timedelta=duration) if duration else "Permanent"
+        embed = discord.Embed(
+            title=f"Mass {type.value}",
+            description=(
+                f"**Issued by:** {ctx.author.mention} ({ctx.author.id})\n"
+                f"**Reason:** {reason}\n"
+                f"**Duration:** {duration_text}"
+            ),
+            color=await ctx.embed_color(),
+            timestamp=now,
+        )
+        embed.add_field(
+            name=f"Actioned ({len(done)})", value=self._mass_mentions(done), inline=False
+        )
+        if failed:
+            embed.add_field(
+                name=f"Failed ({len(failed)})", value=self._mass_mentions(failed), inline=False
+            )
+        if skipped:
+            embed.add_field(
+                name=f"Skipped ({len(skipped)})", value=self._mass_mentions(skipped), inline=False
+            )
+
+        if settings["log_channel"] and (chan := guild.get_channel(settings["log_channel"])):
+            await self._run_sinks(chan.send(embed=embed))
+
+        await ctx.send(embed=embed)
+
+    # <--- Tempban Expiry loop --->
+
+    async def _migrate_expiries(self):
+        # one time scan of the existing infraction history to seed the expiry schedule.
+        await self.expiry_scheduler.schedule_many(
+            [
+                Expiry(
+                    datetime.fromisoformat(infraction["at"]).timestamp() + infraction["duration"],
+                    guild_id,
+                    int(member_id),
+                    infraction["id"],
+                )
+                for guild_id, document in (await self.infraction_cache.documents()).items()
+                for member_id, infractions in document.items()
+                for infraction in infractions
+                if infraction["type"] == "tempban" and infraction["duration"] is not None
+            ]
+        )
+        await self.config.expiries_migrated.set(True)
+
+    @tasks.loop(seconds=0)
+    async def remove_tempbans(self):
+        expiry = await self.expiry_scheduler.next_expired()
+        finished = False
+        try:
+            finished = await self._lift_tempban(expiry)
+        except Exception:
+            log.exception("Failed to lift tempban %s, retrying later", expiry.infraction_id)
+        finally:
+            # also reached when the task is cancelled mid-unban, so the expiry is never lost
+            try:
+                if finished:
+                    await self.expiry_scheduler.done(expiry)
+                else:
+                    await self.expiry_scheduler.retry(expiry)
+            except Exception:
+                log.exception("Failed to save the tempban schedule")
+
+    async def _lift_tempban(self, expiry: Expiry) -> bool:
+        """
+        Unban the member of an expired tempban. Returns False if it should be tried again later.
+        """
+        guild = self.bot.get_guild(expiry.guild_id)
+        if guild is None:
+            # unavailable during an outage, or the bot was removed from it.
+            return False
+
+        if guild.get_member(expiry.user_id) is not None:
+            return True
+
+        if not await self._get_infraction(expiry.guild_id, expiry.user_id, expiry.infraction_id):
+            # the tempban was deleted before it expired.
+            return True
+
+        try:
+            await guild.unban(discord.Object(id=expiry.user_id), reason="Tempban expired")
+
+        except discord.NotFound:
+            # they were already unbanned.
+            pass
+
+        except discord.HTTPException:
+            log.warning(
+                "Couldn't lift tempban %s in %s, retrying later", expiry.infraction_id, guild
+            )
+            return False
 
-                except discord.NotFound:
-                    pass
+        return True
 
     @remove_tempbans.before_loop
     async def before_remove_tempbans(self):
         await self.bot.wait_until_red_ready()
+        await self.expiry_scheduler.load()
+        if not await self.config.expiries_migrated():
+            await self._migrate_expiries()
+
+    # <--- Watchlist Expiry loop --->
+
+    @tasks.loop(seconds=0)
+    async def remove_expired_watchlist(self):
+        guild_id, user_id = await self.watchlist_index.next_expired()
+        try:
+            await self._remove_from_watchlist(guild_id, user_id)
+        except Exception:
+            # the entry is already gone from memory, the saved one expires again on the next load
+            log.exception("Failed to remove expired watchlist entry %s in %s", user_id, guild_id)
+
+    @remove_expired_watchlist.before_loop
+    async def before_remove_expired_watchlist(self):
+        await self.bot.wait_until_red_ready()
+
+    # <--- Infraction persistence loop --->
+
+    @tasks.loop(seconds=INFRACTION_FLUSH_INTERVAL)
+    async def flush_infractions(self):
+        try:
+            await self.infraction_cache.flush()
+        except Exception:
+            log.exception("Failed to save infractions, retrying on the next flush")
+
+    # <--- Log batching loop --->
+
+    async def _send_log_batch(self, batch: LogBatch):
+        for message in batch.messages():
+            try:
+                await batch.channel.send(**message)
+            except discord.HTTPException:
+                log.exception("Failed to send batched log messages to %s", batch.channel.id)
+
+    @tasks.loop(seconds=0)
+    async def send_log_batches(self):
+        batch = await self.log_batcher.next_batch()
+        try:
+            await self._send_log_batch(batch)
+        except Exception:
+            log.exception("Failed to send batched log messages")
+
+    @send_log_batches.before_loop
+    async def before_send_log_batches(self):
+        await self.bot.wait_until_red_ready()
+
+    # <--- Appeal invite pool loop --->
+
+    @tasks.loop(seconds=0)
+    async def refill_appeal_invites(self):
+        server_id, missing = await self.invite_pool.next_refill()
+        try:
+            await self._refill_appeal_invites(server_id, missing)
+        except Exception:
+            log.exception("Failed to refill appeal invites in %s, retrying later", server_id)
+            self.invite_pool.defer(server_id, 5 * 60)
+        try:
+            await self.invite_pool.save()
+        except Exception:
+            log.exception("Failed to save the appeal invite pool")
+
+    async def _refill_appeal_invites(self, server_id: int, missing: int):
+        server = self.bot.get_guild(server_id)
+        if server is None:
+            self.invite_pool.defer(server_id, 5 * 60)
+            return
+
+        for _ in range(missing):
+            try:
+                invite = await self._create_appeal_invite(server, "Appeal invite pool")
+            except discord.HTTPException:
+                invite = None
+            if invite is None:
+                log.warning("Couldn't create appeal invites in %s, retrying later", server_id)
+                self.invite_pool.defer(server_id, 5 * 60)
+                return
+            self.invite_pool.put(server_id, str(invite), time.time())
+
+    @refill_appeal_invites.before_loop
+    async def before_refill_appeal_invites(self):
+        await self.bot.wait_until_red_ready()
+        await self.invite_pool.load()
+        for guild in self.bot.guilds:
+            settings = await self.settings_cache.get(guild.id)
+            self.invite_pool.configure(
+                guild.id, settings["appeal_server"], settings["appeal_pool_size"]
+            )
+
+    # <--- Flag persistence loop --->
+
+    @tasks.loop(seconds=FLAG_FLUSH_INTERVAL)
+    async def flush_flags(self):
+        try:
+            await self.flag_store.flush()
+        except Exception:
+            log.exception("Failed to save flagged messages, retrying on the next flush")
+
+    @flush_flags.before_loop
+    async def before_flush_flags(self):
+        await self.bot.wait_until_red_ready()
+        await self.flag_store.load_queue()
+
+    @tasks.loop(hours=1)
+    async def compact_flags(self):
+        try:
+            await self._compact_flags()
+        except Exception:
+            log.exception("Failed to compact flagged messages, retrying on the next pass")
+
+    async def _compact_flags(self):
+        policies = {}
+        for guild in self.bot.guilds:
+            flagging = (await self.settings_cache.get(guild.id))["flagging"]
+            if flagging["retention_days"] is not None or not flagging["keep_cleared"]:
+                policies[guild.id] = (flagging["retention_days"], flagging["keep_cleared"])
+
+        if policies:
+            await self.flag_store.compact(policies)
+
+    @compact_flags.before_loop
+    async def before_compact_flags(self):
+        await self.bot.wait_until_red_ready()
 
     # <--- listeners --->
 
@@ -579,23 +1038,62 @@ class ModPlus(commands.Cog):
     async def on_modplus_infraction(
         self, ctx: commands.Context, sm: ServerMember, infraction: Infraction
     ):
-        await self._add_infraction(infraction)
         include_invite = ctx.args[-1] if infraction.type.value in ("ban", "tempban") else False
-        dms_open = await self._dm_message(ctx.args[2], infraction, include_invite=include_invite)
-        await self._channel_message(ctx.channel, infraction, dms_open=dms_open)
-        await self._log_infraction(infraction, dms_open=dms_open)
+        await self._record_infraction(
+            ctx.guild, ctx.channel, ctx.args[2], sm, infraction, include_invite
+        )
+
+    async def _record_infraction(
+        self,
+        guild: discord.Guild,
+        channel: discord.abc.Messageable,
+        member: discord.Member,
+        sm: ServerMember,
+        infraction: Infraction,
+        include_invite: bool,
+        run_automod: bool = True,
+    ):
+        await self._add_infraction(infraction)
+        if infraction.type is InfractionType.TEMPBAN and infraction.duration:
+            await self.expiry_scheduler.schedule(
+                infraction.expires_at,
+                infraction.violator.guild_id,
+                infraction.violator.user_id,
+                infraction.id,
+            )
+
+        settings = await self.settings_cache.get(guild.id)
+        seeds = self._infraction_seeds(guild, infraction)
 
+        async def send_messages():
+            # the channel and log messages both report whether the DM went through.
+            dms_open = await self._dm_message(
+                member, infraction, settings, seeds, include_invite=include_invite
+            )
+            await self._run_sinks(
+                self._channel_message(channel, settings, seeds, dms_open),
+                self._log_infraction(guild, settings, seeds, dms_open),
+            )
+
+        sinks = [send_messages()]
         if sm.is_being_watched:
-            await self._notify_watchlist_of_infraction(ctx, infraction)
+            sinks.append(self._notify_watchlist_of_infraction(guild, settings, seeds))
+
+        await self._run_sinks(*sinks)
 
-        await self._check_automod(ctx, ctx.guild.get_member(infraction.violator.user_id))
+        if run_automod:
+            await self._check_automod(guild, channel, sm.user_id, infraction.type.value)
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         if not message.guild or message.author.bot:
             return
 
-        if message.channel.id != await self.config.guild(message.guild).watchlist.channel():
+        settings = await self.settings_cache.get(message.guild.id)
+        if settings["flagging"]["channel"]:
+            self.flag_messages.put(message)
+
+        if message.channel.id != settings["watchlist"]["channel"]:
             return
 
         if message.mentions:
@@ -603,8 +1101,8 @@ class ModPlus(commands.Cog):
             stat = await self._get_watchlist_status(message.guild.id, user.id)
             if stat:
                 duration = (
-                    f"until <t:{int(stat['duration'].timestamp())}:R>"
-                    if stat["duration"]
+                    f"until <t:{int(stat.expires_at.timestamp())}:R>"
+                    if stat.expires_at
                     else "Permanently"
                 )
                 msg = f"User {user.mention} ({user.id}) is on the watchlist {duration}"
@@ -614,6 +1112,20 @@ class ModPlus(commands.Cog):
 
             await message.channel.send(msg)
 
+    @commands.Cog.listener()
+    async def on_raw_message_edit(self, payload: discord.RawMessageUpdateEvent):
+        if "content" in payload.data:
+            self.flag_messages.edit(payload.message_id, payload.data["content"])
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload: discord.RawMessageDeleteEvent):
+        self.flag_messages.discard(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload: discord.RawBulkMessageDeleteEvent):
+        for message_id in payload.message_ids:
+            self.flag_messages.discard(message_id)
+
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload: discord.RawReactionActionEvent):
         if not payload.guild_id:
@@ -621,26 +1133,37 @@ class ModPlus(commands.Cog):
 
         guild = self.bot.get_guild(payload.guild_id)
 
-        if str(payload.emoji) != await self.config.guild(guild).flagging.emoji():
+        settings = (await self.settings_cache.get(payload.guild_id))["flagging"]
+        if str(payload.emoji) != settings["emoji"]:
             return
 
-        fc = guild.get_channel(await self.config.guild(guild).flagging.channel())
+        fc = guild.get_channel(settings["channel"])
         if not fc:
             return
 
-        message_details = await self.config.custom(
-            "FLAGGED", payload.guild_id, payload.channel_id, payload.message_id
-        ).all()
+        key = (payload.guild_id, payload.channel_id, payload.message_id)
+        async with self.flag_locks.hold(key):
+            await self._flag_message(key, payload, guild, fc, settings)
+
+    async def _flag_message(
+        self,
+        key: FlagKey,
+        payload: discord.RawReactionActionEvent,
+        guild: discord.Guild,
+        fc: discord.TextChannel,
+        settings: Mapping[str, Any],
+    ):
+        # called with the message's lock held, so the record can't change under us
+        message_details = await self.flag_store.get(*key)
 
         if message_details:
-            reporters: list[int] = [*message_details["reporters"], payload.user_id]
-            await self.config.custom(
-                "FLAGGED", payload.guild_id, payload.channel_id, payload.message_id
-            ).set_raw("reporters", value=reporters)
+            reporters = self.flag_store.add_reporter(key, payload.user_id)
+            if reporters is None:
+                return
 
-            threshold = await self.config.guild(guild).flagging.ping_threshold()
+            threshold = settings["ping_threshold"]
             if len(reporters) == threshold:
-                ping_role = await self.config.guild(guild).flagging.mod_role()
+                ping_role = settings["mod_role"]
                 alert_message = discord.PartialMessage(
                     channel=fc, id=message_details["alert_message"]
                 )
@@ -652,25 +1175,18 @@ class ModPlus(commands.Cog):
 
             return
 
+        # only new flags are rate limited, checked before fetching so spam costs no requests
+        if not self.flag_cooldowns.hit(payload.guild_id, payload.user_id, settings["cooldown"]):
+            return
+
+        channel = guild.get_channel_or_thread(payload.channel_id)
         try:
-            message = await self.bot.get_channel(payload.channel_id).fetch_message(
-                payload.message_id
-            )
+            message = await self.flag_messages.fetch(channel, payload.message_id)
 
         except discord.NotFound:
             return
 
         if not message_details:
-            if not (cache := self.cooldown_cache.get(payload.guild_id)):
-                self.cooldown_cache[payload.message_id] = cache = TTLCache(
-                    5, await self.config.guild(guild).flagging.cooldown()
-                )
-                cache.update({payload.user_id: payload.message_id})
-
-            else:
-                if cache.get(payload.user_id):
-                    return
-
             reporters = [payload.user_id]
 
             embed = self._create_flag_embed(
@@ -678,7 +1194,7 @@ class ModPlus(commands.Cog):
                 payload.channel_id,
                 payload.message_id,
                 payload.member.id,
-                message.author.id,
+                message.author_id,
                 message.content,
                 reporters,
             )
@@ -689,7 +1205,7 @@ class ModPlus(commands.Cog):
 
             message_details = {
                 "content": message.content,
-                "author_id": message.author.id,
+                "author_id": message.author_id,
                 "timestamp": message.created_at.isoformat(),
                 "alert_message": msg.id,
                 "cleared": False,
@@ -697,11 +1213,10 @@ class ModPlus(commands.Cog):
                 "flagged_by": payload.member.id,
             }
 
-            await self.config.custom(
-                "FLAGGED", payload.guild_id, payload.channel_id, payload.message_id
-            ).set(message_details)
+            self.flag_store.create(key, message_details)
 
-            await message.clear_reaction(payload.emoji)
+            await channel.get_partial_message(payload.message_id).clear_reaction(payload.emoji)
+            await self._check_automod(guild, channel, message.author_id, "flag")
 
     # <--- Commands --->
 
@@ -734,6 +1249,7 @@ class ModPlus(commands.Cog):
             emoji = str(emoji)
 
         await self.config.guild(ctx.guild).flagging.emoji.set(emoji)
+        await self._settings_changed(ctx.guild)
         await ctx.send(f"Flag emoji set to {emoji}")
 
     @mpset_flag.command(name="channel", aliases=["ch"])
@@ -742,6 +1258,7 @@ class ModPlus(commands.Cog):
         Set the channel that flagged messages will be sent to.
         """
         await self.config.guild(ctx.guild).flagging.channel.set(channel.id)
+        await self._settings_changed(ctx.guild)
         await ctx.send(f"Flagged messages will be sent to {channel.mention}")
 
     @mpset_flag.command(name="modrole", aliases=["mr"])
@@ -750,6 +1267,7 @@ class ModPlus(commands.Cog):
         Set the role that will be pinged when a message is flagged.
         """
         await self.config.guild(ctx.guild).flagging.mod_role.set(role.id)
+        await self._settings_changed(ctx.guild)
         await ctx.send(f"{role.mention} will be pinged when a message is flagged.")
 
     @mpset_flag.command(name="cooldown", aliases=["cd"])
@@ -760,6 +1278,7 @@ class ModPlus(commands.Cog):
         Cooldown must be in seconds
         """
         await self.config.guild(ctx.guild).flagging.cooldown.set(cooldown)
+        await self._settings_changed(ctx.guild)
         await ctx.send(f"Flagging cooldown set to {cooldown} seconds.")
 
     @mpset_flag.command(name="threshold", aliases=["th"])
@@ -770,14 +1289,55 @@ class ModPlus(commands.Cog):
         Threshold is the number of flags a message must receive before the mod role is pinged.
         """
         await self.config.guild(ctx.guild).flagging.ping_threshold.set(threshold)
+        await self._settings_changed(ctx.guild)
         await ctx.send(f"Flagging threshold set to {threshold}.")
 
+    @mpset_flag.command(name="retention")
+    async def mpset_flag_retention(
+        self, ctx: commands.Context, days: Union[int, Literal["clear"]]
+    ):
+        """
+        Set how many days flagged messages are kept before they are archived.
+
+        Archived flags are moved out of the bot's config but their alert buttons keep working.
+        Use `clear` to keep flagged messages forever.
+        """
+        if days == "clear":
+            await self.config.guild(ctx.guild).flagging.retention_days.clear()
+            await self._settings_changed(ctx.guild)
+            return await ctx.send("Flagged messages will be kept forever.")
+
+        if days < 1:
+            return await ctx.send("Retention must be at least 1 day.")
+
+        await self.config.guild(ctx.guild).flagging.retention_days.set(days)
+        await self._settings_changed(ctx.guild)
+        await ctx.send(f"Flagged messages older than {days} days will be archived.")
+
+    @mpset_flag.command(name="keepcleared", aliases=["kc"])
+    async def mpset_flag_keepcleared(self, ctx: commands.Context, toggle: bool):
+        """
+        Toggle whether cleared flags are kept or archived.
+        """
+        await self.config.guild(ctx.guild).flagging.keep_cleared.set(toggle)
+        await self._settings_changed(ctx.guild)
+        await ctx.send(
+            f"Cleared flags will {'now be kept' if toggle else 'be archived from now on'}."
+        )
+
     @mpset_flag.command(name="show")
     async def mpset_flag_show(self, ctx: commands.Context):
         """
         Show the current flagging settings.
         """
         flagging = await self.config.guild(ctx.guild).flagging()
+        cooldown = self.flag_cooldowns.stats(ctx.guild.id)
+        cooldown_stats = (
+            f"{cooldown.hits} checked, {cooldown.drops} dropped, "
+            f"{cooldown.evictions} users evicted, {len(cooldown)} users tracked"
+            if cooldown
+            else "No flags checked yet"
+        )
         await ctx.send(
             cf.box(
                 f"""
@@ -786,7 +1346,10 @@ class ModPlus(commands.Cog):
                     Flag channel: {ctx.guild.get_channel(flagging['channel'])}
                     Mod role: {ctx.guild.get_role(flagging['mod_role'])}
                     Cooldown: {flagging['cooldown']}
+                    Cooldown stats: {cooldown_stats}
                     Threshold: {flagging['ping_threshold']}
+                    Retention: {f"{flagging['retention_days']} days" if flagging['retention_days'] else 'Forever'}
+                    Keep cleared flags: {flagging['keep_cleared']}
                 """
             )
         )
@@ -806,6 +1369,7 @@ class ModPlus(commands.Cog):
         Set the channel that watchlist notifications will be sent to.
         """
         await self.config.guild(ctx.guild).watchlist.channel.set(channel.id)
+        await self._settings_changed(ctx.guild)
         await ctx.send(f"Watchlist notifications will be sent to {channel.mention}")
 
     @mpset_wl.command(name="notifyoninfraction", aliases=["noi"])
@@ -813,7 +1377,8 @@ class ModPlus(commands.Cog):
         """
         Toggle whether or not to notify the watchlist when a user is added to the watchlist.
         """
-        await self.config.guild(ctx.guild).watchlist.notify_on_infraction.set(toggle)
+        await self.config.guild(ctx.guild).watchlist.notify.set(toggle)
+        await self._settings_changed(ctx.guild)
         await ctx.send(
             f"Watchlist will {'now' if toggle else 'no longer'} notify on infractions done by users on the watchlist"
         )
@@ -838,10 +1403,12 @@ class ModPlus(commands.Cog):
         """
         if message == "clear":
             await self.config.guild(ctx.guild).watchlist.infraction_message.clear()
+            await self._settings_changed(ctx.guild)
             return await ctx.send("Watchlist notify message cleared")
 
         elif message == "default":
             await self.config.guild(ctx.guild).watchlist.infraction_message.clear()
+            await self._settings_changed(ctx.guild)
             return await ctx.send("Watchlist notify message set to default")
 
         elif message is None:
@@ -850,6 +1417,7 @@ class ModPlus(commands.Cog):
             )
 
         await self.config.guild(ctx.guild).watchlist.infraction_message.set(message)
+        await self._settings_changed(ctx.guild)
         await ctx.send("Watchlist notify message set")
 
     @mpset_wl.command(name="show")
@@ -897,7 +1465,8 @@ class ModPlus(commands.Cog):
 
             reason_sh[shorthand] = reason
 
-            return await ctx.send("Added shorthand: `{}` - `{}`".format(shorthand, reason))
+        await self._settings_changed(ctx.guild)
+        return await ctx.send("Added shorthand: `{}` - `{}`".format(shorthand, reason))
 
     @mpset_rsh.command(name="remove", aliases=["delete", "del"])
     async def mpset_rsh_remove(self, ctx: commands.Context, shorthand: str):
@@ -910,7 +1479,8 @@ class ModPlus(commands.Cog):
 
             del reason_sh[shorthand]
 
-            return await ctx.send("Removed shorthand: `{}`".format(shorthand))
+        await self._settings_changed(ctx.guild)
+        return await ctx.send("Removed shorthand: `{}`".format(shorthand))
 
     @mpset_rsh.command(name="list")
     async def mpset_rsh_list(self, ctx: commands.Context):
@@ -951,6 +1521,7 @@ class ModPlus(commands.Cog):
         Which will add another infraction, making it 4. Which will action them again. And so on.
 
         Use `clear` for the `action` argument to remove the automod for that infraction count.
+        See `[p]mpset automod window` for rules based on infractions within a length of time.
         """
 
         async with self.config.guild(ctx.guild).automod() as automod:
@@ -959,84 +1530,164 @@ class ModPlus(commands.Cog):
                     return await ctx.send("There is no automod for that infraction count.")
 
                 del automod[str(infraction_count)]
-                return await ctx.send(
-                    "Removed automod for infraction count: `{}`".format(infraction_count)
-                )
 
-            if a := automod.get(str(infraction_count)):
-                view = YesOrNoView(ctx, "", "Alright, it will remain the same.")
-                if isinstance(a, int):
+            else:
+                if a := automod.get(str(infraction_count)):
+                    view = YesOrNoView(ctx, "", "Alright, it will remain the same.")
+                    if isinstance(a, int):
+                        await ctx.send(
+                            f"That infraction count is already set to `tempban` the user for {a}. Do you want to change it to `{action}`?",
+                            view=view,
+                        )
+                    else:
+                        await ctx.send(
+                            f"That infraction count is already set to `{a}` the user. Do you want to change it to `{action}`?",
+                            view=view,
+                        )
+
+                    await view.wait()
+
+                    if not view.value:
+                        return
+
+                if action in ("tempban", "mute"):
                     await ctx.send(
-                        f"That infraction count is already set to `tempban` the user for {a}. Do you want to change it to `{action}`?",
-                        view=view,
+                        f"How long do you want to {action} the user for? (days, weeks, hours, minutes)"
                     )
-                else:
-                    await ctx.send(
-                        f"That infraction count is already set to `{a}` the user. Do you want to change it to `{action}`?",
-                        view=view,
+                    msg = await ctx.bot.wait_for(
+                        "message",
+                        check=lambda m: m.author == ctx.author and m.channel == ctx.channel,
+                        timeout=60,
                     )
+                    try:
+                        time: timedelta = await timedelta_converter().convert(ctx, msg.content)
+                    except TimeoutError:
+                        return await ctx.send("Timed Out.")
+                    except ValueError:
+                        return await ctx.send("That is not a valid number.")
+                    else:
+                        automod[str(infraction_count)] = f"{action} {int(time.total_seconds())}"
 
-                await view.wait()
-
-                if not view.value:
-                    return
-
-            if action in ("tempban", "mute"):
-                await ctx.send(
-                    f"How long do you want to {action} the user for? (days, weeks, hours, minutes)"
-                )
-                msg = await ctx.bot.wait_for(
-                    "message",
-                    check=lambda m: m.author == ctx.author and m.channel == ctx.channel,
-                    timeout=60,
-                )
-                try:
-                    time: timedelta = await timedelta_converter().convert(ctx, msg.content)
-                except TimeoutError:
-                    return await ctx.send("Timed Out.")
-                except ValueError:
-                    return await ctx.send("That is not a valid number.")
                 else:
-                    automod[infraction_count] = f"{action} {int(time.total_seconds())}"
+                    automod[str(infraction_count)] = action
 
-            else:
-                automod[infraction_count] = action
-
-            await ctx.send(
-                f"Alright, I will {action} users with more than {infraction_count} infractions."
+        await self._settings_changed(ctx.guild)
+        if action == "clear":
+            return await ctx.send(
+                "Removed automod for infraction count: `{}`".format(infraction_count)
             )
 
+        await ctx.send(
+            f"Alright, I will {action} users with more than {infraction_count} infractions."
+        )
+
     @mpset_automod.command(name="show")
     async def mpset_automod_show(self, ctx: commands.Context):
         """
         Show the automod settings for the guild.
         """
-        automod = await self.config.guild(ctx.guild).automod()
+        settings = await self.settings_cache.get(ctx.guild.id)
+        rules = self.automod_cache.get(ctx.guild.id, settings["automod"])
 
-        if not automod:
+        if not rules.thresholds and not rules.windows:
             return await ctx.send("There are no automod settings.")
 
+        def describe(action: AutomodAction):
+            if not action.duration:
+                return f"`{action.command}`"
+            return f"`{action.command} for {cf.humanize_timedelta(timedelta=action.duration)}`"
+
         embed = discord.Embed(
             title=f"Automod Settings for {ctx.guild.name}",
             description="\n".join(
-                [
-                    f"`{infraction_count}` - `{action}`"
-                    if len(a := action.split()) == 1
-                    else f"`{infraction_count}` - `{a[0]} for {cf.humanize_timedelta(seconds=int(a[1]))}`"
-                    for infraction_count, action in automod.items()
-                ]
+                f"`{count}` - {describe(action)}"
+                for count, action in sorted(rules.thresholds.items())
             ),
             color=await ctx.bot.get_embed_color(ctx.channel),
         )
+        if windows := settings["automod"].get("windows"):
+            embed.add_field(
+                name="Window rules",
+                value="\n".join(
+                    f"{index}. `{w['count']} {w['kind']}s` within "
+                    f"`{cf.humanize_timedelta(seconds=w['seconds'])}` - "
+                    f"{describe(AutomodAction.parse(w['action']))}"
+                    for index, w in enumerate(windows, 1)
+                ),
+                inline=False,
+            )
 
         await ctx.send(embed=embed)
 
+    @mpset_automod.group(name="window", aliases=["windows"], invoke_without_command=True)
+    async def mpset_automod_window(self, ctx: commands.Context):
+        """
+        Automod rules for a number of infractions or flags within a length of time.
+
+        For example, 3 warns within 10 minutes could mute a member for an hour.
+        """
+        return await ctx.send_help()
+
+    @mpset_automod_window.command(name="add")
+    async def mpset_automod_window_add(
+        self,
+        ctx: commands.Context,
+        kind: Literal["warn", "mute", "kick", "ban", "tempban", "infraction", "flag"],
+        count: commands.Range[int, 2, 50],
+        within: timedelta_converter,
+        action: Literal["ban", "kick", "mute", "warn", "tempban"],
+        duration: Optional[timedelta_converter] = None,
+    ):
+        """
+        Add a window rule.
+
+        `kind` is what is counted: an infraction type, `infraction` for any infraction or `flag` for the member's messages being flagged.
+        `duration` is needed for `mute` and `tempban`.
+
+        Example: `[p]mpset automod window add warn 3 10m mute 1h`
+        """
+        if action in ("mute", "tempban") and not duration:
+            return await ctx.send(f"You need to give a duration to {action} for.")
+
+        rule = {
+            "kind": kind,
+            "count": count,
+            "seconds": int(within.total_seconds()),
+            "action": f"{action} {int(duration.total_seconds())}" if duration else action,
+        }
+        async with self.config.guild(ctx.guild).automod() as automod:
+            automod.setdefault("windows", []).append(rule)
+
+        await self._settings_changed(ctx.guild)
+        await ctx.send(
+            f"Alright, I will {action} users with {count} {kind}s within "
+            f"{cf.humanize_timedelta(timedelta=within)}."
+        )
+
+    @mpset_automod_window.command(name="remove", aliases=["delete", "del"])
+    async def mpset_automod_window_remove(self, ctx: commands.Context, index: int):
+        """
+        Remove a window rule by its number in `[p]mpset automod show`.
+        """
+        async with self.config.guild(ctx.guild).automod() as automod:
+            windows = automod.get("windows", [])
+            if not 0 < index <= len(windows):
+                return await ctx.send("There is no window rule with that number.")
+
+            del windows[index - 1]
+            if not windows:
+                automod.pop("windows", None)
+
+        await self._settings_changed(ctx.guild)
+        await ctx.send(f"Removed window rule {index}.")
+
     @mpset_automod.command(name="clear")
     async def mpset_automod_clear(self, ctx: commands.Context):
         """
         Clear all automod settings for the guild.
         """
         await self.config.guild(ctx.guild).automod.clear()
+        await self._settings_changed(ctx.guild)
         await ctx.send("Cleared all automod settings.")
 
     # <--- Logging --->
@@ -1061,6 +1712,7 @@ class ModPlus(commands.Cog):
         """
         if channel == "clear":
             await self.config.guild(ctx.guild).log_channel.clear()
+            await self._settings_changed(ctx.guild)
             return await ctx.send("Cleared the log channel.")
 
         elif channel is None:
@@ -1070,6 +1722,7 @@ class ModPlus(commands.Cog):
             return await ctx.send(f"The current log channel is {channel.mention}.")
 
         await self.config.guild(ctx.guild).log_channel.set(channel.id)
+        await self._settings_changed(ctx.guild)
         return await ctx.send(f"Set the log channel to {channel.mention}.")
 
     @mpset_log.command(name="message")
@@ -1097,10 +1750,12 @@ class ModPlus(commands.Cog):
         """
         if tagscript == "clear":
             await self.config.guild(ctx.guild).log_message.set("")
+            await self._settings_changed(ctx.guild)
             return await ctx.send("Cleared the log message.")
 
         if tagscript == "default":
             await self.config.guild(ctx.guild).log_message.clear()
+            await self._settings_changed(ctx.guild)
             return await ctx.send("Set the log message to the default message.")
 
         elif tagscript is None:
@@ -1110,8 +1765,36 @@ class ModPlus(commands.Cog):
             return await ctx.send(f"The current log message is ```{tagscript}```")
 
         await self.config.guild(ctx.guild).log_message.set(tagscript)
+        await self._settings_changed(ctx.guild)
         return await ctx.send(f"Set the log message to ```{tagscript}```")
 
+    @mpset_log.command(name="batch")
+    async def mpset_log_batch(
+        self,
+        ctx: commands.Context,
+        window: Union[commands.Range[int, 1, 300], Literal["off"], None] = None,
+    ):
+        """
+        Batch log messages together instead of sending one message per action.
+
+        Log messages are collected for `window` seconds (or until there are 10 embeds) and sent together as one message. Useful during raids when the log channel would otherwise be flooded.
+        Use `off` to send every log message straight away or don't provide a window to see the current setting.
+        """
+        if window == "off":
+            await self.config.guild(ctx.guild).log_batch_window.clear()
+            await self._settings_changed(ctx.guild)
+            return await ctx.send("Log messages will now be sent straight away.")
+
+        elif window is None:
+            window = await self.config.guild(ctx.guild).log_batch_window()
+            if window is None:
+                return await ctx.send("Log batching is off.")
+            return await ctx.send(f"Log messages are batched every {window} seconds.")
+
+        await self.config.guild(ctx.guild).log_batch_window.set(window)
+        await self._settings_changed(ctx.guild)
+        return await ctx.send(f"Log messages will now be batched every {window} seconds.")
+
     @mpset_log.command(name="show")
     async def mpset_log_show(self, ctx: commands.Context):
         """
@@ -1119,13 +1802,14 @@ class ModPlus(commands.Cog):
         """
         log_channel = await self.config.guild(ctx.guild).log_channel()
         log_message = await self.config.guild(ctx.guild).log_message()
+        batch_window = await self.config.guild(ctx.guild).log_batch_window()
 
         if not log_channel:
             return await ctx.send("There is no log channel set.")
 
         embed = discord.Embed(
             title=f"Logging Settings for {ctx.guild.name}",
-            description=f"Log Channel: {getattr(ctx.guild.get_channel(log_channel), 'mention', 'N/A')}\nLog Message: ```{log_message or 'N/A'}```",
+            description=f"Log Channel: {getattr(ctx.guild.get_channel(log_channel), 'mention', 'N/A')}\nBatching: {f'every {batch_window} seconds' if batch_window else 'Off'}\nLog Message: ```{log_message or 'N/A'}```",
             color=await ctx.bot.get_embed_color(ctx.channel),
         )
 
@@ -1144,17 +1828,69 @@ class ModPlus(commands.Cog):
         """
         if server == "clear":
             await self.config.guild(ctx.guild).appeal_server.clear()
+            await self._settings_changed(ctx.guild)
             return await ctx.send("Cleared the appeal server.")
 
         elif server is None:
-            server = await self.config.guild(ctx.guild).appeal_server()
-            if server is None:
+            server_id = await self.config.guild(ctx.guild).appeal_server()
+            if server_id is None:
                 return await ctx.send("There is no appeal server set.")
-            return await ctx.send(f"The current appeal server is {server.name}.")
+            server = self.bot.get_guild(server_id)
+            return await ctx.send(
+                f"The current appeal server is {getattr(server, 'name', server_id)}."
+            )
 
         await self.config.guild(ctx.guild).appeal_server.set(server.id)
+        await self._settings_changed(ctx.guild)
         return await ctx.send(f"Set the appeal server to {server.name}.")
 
+    @mpset.command(name="appealpool")
+    async def mpset_appealpool(
+        self, ctx: commands.Context, size: Optional[commands.Range[int, 0, 25]] = None
+    ):
+        """
+        Set how many appeal invites are kept ready ahead of time.
+
+        Invites are made in the background so bans and kicks don't wait on creating one. Set it to 0 to create invites only when they're needed.
+        Don't provide a size to see the current one.
+        """
+        if size is None:
+            size = await self.config.guild(ctx.guild).appeal_pool_size()
+            return await ctx.send(f"{size} appeal invites are kept ready.")
+
+        await self.config.guild(ctx.guild).appeal_pool_size.set(size)
+        await self._settings_changed(ctx.guild)
+        return await ctx.send(f"{size} appeal invites will now be kept ready.")
+
+    # <--- Infraction Storage --->
+
+    @mpset.command(name="infractionstorage", aliases=["infstorage"])
+    @commands.is_owner()
+    async def mpset_infractionstorage(
+        self,
+        ctx: commands.Context,
+        backend: Optional[Literal["config", "columnar"]] = None,
+    ):
+        """
+        Choose where infractions are stored.
+
+        `config` keeps them in the bot's config like all other settings.
+        `columnar` keeps them in compact binary files in the cog's data folder, which load much faster
+        and take far less memory on servers with large infraction histories.
+
+        Switching moves every server's infractions to the new storage.
+        Don't provide a backend to see the current one.
+        """
+        if backend is None:
+            return await ctx.send(
+                f"Infractions are currently stored in `{await self.config.infraction_backend()}`."
+            )
+
+        async with ctx.typing():
+            moved = await self.infraction_cache.migrate(backend)
+
+        await ctx.send(f"Infractions are now stored in `{backend}`. Moved {moved} servers.")
+
     # <--- DM on Infraction --->
 
     @mpset.command(name="dm")
@@ -1179,10 +1915,12 @@ class ModPlus(commands.Cog):
         """
         if dm == "clear":
             await self.config.guild(ctx.guild).dm_message.set("")
+            await self._settings_changed(ctx.guild)
             return await ctx.send("Cleared the DM message.")
 
         elif dm == "default":
             await self.config.guild(ctx.guild).dm_message.clear()
+            await self._settings_changed(ctx.guild)
             return await ctx.send("Set the DM message to the default message.")
 
         elif dm is None:
@@ -1192,6 +1930,7 @@ class ModPlus(commands.Cog):
             return await ctx.send(f"The current DM message is ```{dm}```")
 
         await self.config.guild(ctx.guild).dm_message.set(dm)
+        await self._settings_changed(ctx.guild)
         return await ctx.send(f"Set the DM message to ```{dm}```")
 
     @mpset.command(name="channelmessage", aliases=["cm"])
@@ -1214,10 +1953,12 @@ class ModPlus(commands.Cog):
         """
         if cm == "clear":
             await self.config.guild(ctx.guild).channel_message.set("")
+            await self._settings_changed(ctx.guild)
             return await ctx.send("Cleared the channel message.")
 
         elif cm == "default":
             await self.config.guild(ctx.guild).channel_message.clear()
+            await self._settings_changed(ctx.guild)
             return await ctx.send("Set the channel message to the default message.")
 
         elif cm is None:
@@ -1227,6 +1968,7 @@ class ModPlus(commands.Cog):
             return await ctx.send(f"The current channel message is ```{cm}```")
 
         await self.config.guild(ctx.guild).channel_message.set(cm)
+        await self._settings_changed(ctx.guild)
         return await ctx.send(f"Set the channel message to ```{cm}```")
 
     @mpset.command(name="tagscripttest", aliases=["tst", "tstest"])
@@ -1256,17 +1998,7 @@ class ModPlus(commands.Cog):
             For example, `reason: test` OR `duration: 1d` OR `action: ban`
             OR combined: `reason: test duration: 1d action: ban`
         """
-        seeds = {
-            "server": tse.GuildAdapter(ctx.guild),
-            "violator": tse.MemberAdapter(ctx.guild.get_member(infraction.violator.user_id)),
-            "issuer": tse.MemberAdapter(ctx.guild.get_member(infraction.issuer_id)),
-            "reason": tse.StringAdapter(infraction.reason),
-            "id": tse.StringAdapter(str(infraction.id)),
-            "type": tse.StringAdapter(infraction.type.value),
-            "duration": tse.IntAdapter(infraction.duration.total_seconds())
-            if infraction.duration
-            else tse.StringAdapter("Permanent"),
-        }
+        seeds = self._infraction_seeds(ctx.guild, infraction)
 
         message = await self.config.guild(ctx.guild).get_attr(f"{ts}_message")()
         processed = process_tagscript(message, seeds)
@@ -1381,6 +2113,95 @@ class ModPlus(commands.Cog):
         infraction = await sm.infraction(ctx, reason)
         await user.kick(reason=reason)
 
+    @commands.command(name="massban")
+    @commands.has_permissions(ban_members=True)
+    async def massban(
+        self,
+        ctx: commands.Context,
+        users: commands.Greedy[commands.RawUserIdConverter],
+        until: Optional[timedelta_converter] = None,
+        *,
+        reason: str,
+    ):
+        """
+        Ban many users at once.
+
+        Users can be mentions or IDs, and a text file of IDs can be attached to the message. Users that aren't in the server are banned by ID.
+        """
+        await self._mass_action(
+            ctx,
+            InfractionType.TEMPBAN if until else InfractionType.BAN,
+            users,
+            until,
+            reason,
+            lambda target, reason: ctx.guild.ban(target, reason=reason),
+            require_member=False,
+        )
+
+    @commands.command(name="masskick")
+    @commands.has_permissions(ban_members=True)
+    async def masskick(
+        self,
+        ctx: commands.Context,
+        users: commands.Greedy[commands.RawUserIdConverter],
+        *,
+        reason: str,
+    ):
+        """
+        Kick many users at once.
+
+        Users can be mentions or IDs, and a text file of IDs can be attached to the message.
+        """
+        await self._mass_action(
+            ctx,
+            InfractionType.KICK,
+            users,
+            None,
+            reason,
+            lambda target, reason: target.kick(reason=reason),
+        )
+
+    @commands.command(name="massmute")
+    @commands.has_permissions(ban_members=True)
+    async def massmute(
+        self,
+        ctx: commands.Context,
+        users: commands.Greedy[commands.RawUserIdConverter],
+        until: timedelta_converter,
+        *,
+        reason: str,
+    ):
+        """
+        Mute many users at once.
+
+        Users can be mentions or IDs, and a text file of IDs can be attached to the message.
+        """
+        await self._mass_action(
+            ctx,
+            InfractionType.MUTE,
+            users,
+            until,
+            reason,
+            lambda target, reason: target.timeout(until, reason=reason),
+        )
+
+    @commands.command(name="masswarn")
+    @commands.has_permissions(ban_members=True)
+    async def masswarn(
+        self,
+        ctx: commands.Context,
+        users: commands.Greedy[commands.RawUserIdConverter],
+        until: Optional[timedelta_converter] = timedelta(minutes=30),
+        *,
+        reason: str,
+    ):
+        """
+        Warn many users at once.
+
+        Users can be mentions or IDs, and a text file of IDs can be attached to the message. Automod isn't run for mass warnings.
+        """
+        await self._mass_action(ctx, InfractionType.WARN, users, until, reason)
+
     # <--- Infractions --->
 
     @commands.group(name="infractions", aliases=["infraction"], invoke_without_command=True)
@@ -1393,7 +2214,7 @@ class ModPlus(commands.Cog):
 
     @infractions.command(name="delete", aliases=["remove"])
     async def infractions_delete(
-        self, ctx: commands.Context, user: discord.Member, infraction_id: int
+        self, ctx: commands.Context, user: discord.Member, infraction_id: str
     ):
         """
         Delete an infraction.
@@ -1409,7 +2230,7 @@ class ModPlus(commands.Cog):
             return await ctx.send("You cannot delete that infraction.")
 
         sm = await ServerMember.from_member(self, user)
-        await sm.delete_infraction(self, infraction_id)
+        await sm.delete_infraction(self, infraction)
         await ctx.send("Infraction deleted.")
 
     @infractions.command(name="clear")
@@ -1446,9 +2267,191 @@ class ModPlus(commands.Cog):
         if not infractions:
             return await ctx.send("This user has no infractions.")
 
-        embeds = [self._create_infraction_embed(infraction) for infraction in infractions]
+        await InfractionPagination(ctx, infractions, self._create_infraction_embed).start()
+
+    @infractions.command(name="search")
+    async def infractions_search(self, ctx: commands.Context, *, filters: InfractionSearchFlags):
+        """
+        Search the infractions of this server.
+
+        All filters are optional and can be combined:
+        - `type:` the type of infraction (ban, kick, mute, warn, tempban). Several can be given separated by spaces.
+        - `user:` the user who received the infraction.
+        - `issuer:` the moderator who issued the infraction.
+        - `within:` only infractions from the last given duration. For example, `30 days`
+        - `after:` and `before:` dates in the `YYYY-MM-DD` format. Both days are included.
+        - `reason:` text that the reason contains.
+        - `status:` `active` or `expired`.
+
+        For example, `[p]infractions search type: tempban issuer: @mod within: 30 days`
+        """
+        after = filters.after
+        if filters.within:
+            since = datetime.now(timezone.utc) - filters.within
+            after = max(after, since) if after else since
+
+        to_us = lambda dt: (dt - EPOCH) // MICROSECOND
+        results = await self.infraction_cache.search(
+            ctx.guild.id,
+            user_id=getattr(filters.user, "id", None),
+            issuer_id=getattr(filters.issuer, "id", None),
+            types={INFRACTION_TYPES[t] for t in filters.type} or None,
+            after_us=to_us(after) if after else None,
+            before_us=to_us(filters.before + timedelta(days=1)) - 1 if filters.before else None,
+            reason=filters.reason,
+            active=None if filters.status is None else filters.status == "active",
+        )
+        if not results:
+            return await ctx.send("No infractions match those filters.")
+
+        await InfractionPagination(ctx, results, self._create_infraction_embed).start()
+
+    @infractions.command(name="export")
+    @commands.admin_or_permissions(administrator=True)
+    async def infractions_export(
+        self,
+        ctx: commands.Context,
+        fmt: TransferFormat = "jsonl",
+        destination: Literal["attachment", "file"] = "attachment",
+    ):
+        """
+        Export the infractions of this server as JSON lines or CSV.
+
+        The file is sent here, or kept in the cog's data folder if the destination is `file` or it's too large to upload.
+        """
+        folder = cog_data_path(self) / "transfers"
+        folder.mkdir(exist_ok=True)
+        path = folder / f"infractions-{ctx.guild.id}-{int(time.time())}.{fmt}"
+
+        count = 0
+        async with ctx.typing():
+            with path.open("w", newline="", encoding="utf-8") as f:
+                async for batch in self.infraction_cache.export_batches(
+                    ctx.guild.id, TRANSFER_BATCH_SIZE
+                ):
+                    records = [to_record(inf) for inf in batch]
+                    await asyncio.to_thread(write_records, f, fmt, records, count == 0)
+                    count += len(records)
+
+        if not count:
+            path.unlink()
+            return await ctx.send("This server has no infractions.")
+
+        if destination == "attachment" and path.stat().st_size <= ctx.guild.filesize_limit:
+            await ctx.send(f"Exported {count} infractions.", file=discord.File(path))
+            path.unlink()
+            return
+
+        await ctx.send(
+            f"Exported {count} infractions to `{path.name}` in the cog's data folder ({folder})."
+        )
+
+    @infractions.command(name="import")
+    @commands.admin_or_permissions(administrator=True)
+    async def infractions_import(self, ctx: commands.Context, filename: Optional[str] = None):
+        """
+        Import infractions from a JSON lines or CSV file made with `[p]infractions export`.
+
+        Attach the file, or give the name of a file in the `transfers` folder of the cog's data folder.
+        Infractions this server already has are skipped.
+        """
+        folder = cog_data_path(self) / "transfers"
+        attachment = None
+        if filename is not None:
+            if Path(filename).name != filename:
+                return await ctx.send("Give the name of a file in the transfers folder, not a path.")
+            path = folder / filename
+            if not path.is_file():
+                return await ctx.send("That file does not exist.")
+        elif ctx.message.attachments:
+            attachment = ctx.message.attachments[0]
+            path = folder / f"import-{ctx.message.id}{Path(attachment.filename).suffix}"
+        else:
+            return await ctx.send("Attach a file or give the name of one in the transfers folder.")
+
+        if (fmt := format_for(path)) is None:
+            return await ctx.send("The file must be a `.jsonl` or `.csv` file.")
+
+        imported = total = 0
+        try:
+            async with ctx.typing():
+                if attachment is not None:
+                    folder.mkdir(exist_ok=True)
+                    await attachment.save(path)
+
+                with path.open(newline="", encoding="utf-8") as f:
+                    records = read_records(f, fmt, ctx.guild.id)
+                    while batch := await asyncio.to_thread(
+                        list, itertools.islice(records, TRANSFER_BATCH_SIZE)
+                    ):
+                        total += len(batch)
+                        imported += await self.infraction_cache.import_many(ctx.guild.id, batch)
+        except ValueError:
+            return await ctx.send(
+                f"The file has an invalid record after the first {total} records. "
+                f"{imported} infractions were imported before it."
+            )
+        finally:
+            if attachment is not None:
+                path.unlink(missing_ok=True)
+
+        await ctx.send(
+            f"Imported {imported} infractions. "
+            f"Skipped {total - imported} that this server already has."
+        )
+
+    # <--- Flags --->
+
+    @commands.group(name="flags", invoke_without_command=True)
+    @commands.has_permissions(ban_members=True)
+    async def flags(self, ctx: commands.Context):
+        """
+        Flagged message commands.
+        """
+        return await ctx.send_help(ctx.command)
+
+    @flags.command(name="queue")
+    async def flags_queue(self, ctx: commands.Context):
+        """
+        See the flagged messages that haven't been cleared, most reported first.
 
-        await InfractionPagination(ctx, embeds, infractions).start()
+        Messages with the same number of reporters are ordered newest first.
+        """
+        await self.flag_store.load_queue()
+        queue = self.flag_store.queue.get(ctx.guild.id)
+        if not queue:
+            return await ctx.send("There are no flagged messages waiting for review.")
+
+        flag_channel = (await self.settings_cache.get(ctx.guild.id))["flagging"]["channel"]
+        per_page = 6
+        pages = -(-len(queue) // per_page)
+
+        def render(index: int) -> discord.Embed:
+            embed = discord.Embed(
+                title=f"Flag queue for {ctx.guild.name}",
+                description=f"Total: {len(queue)}",
+                color=discord.Color.yellow(),
+            )
+            start = index * per_page
+            for position, flag in enumerate(queue[start : start + per_page], start + 1):
+                guild_id, channel_id, message_id = flag.key
+                links = f"[Message](https://discord.com/channels/{guild_id}/{channel_id}/{message_id})"
+                if flag_channel and flag.alert_message:
+                    links += f" | [Alert](https://discord.com/channels/{guild_id}/{flag_channel}/{flag.alert_message})"
+                embed.add_field(
+                    name=f"{position}. {flag.reporters} reporters",
+                    value=(
+                        f"**Author:** <@{flag.author_id}> ({flag.author_id})\n"
+                        f"**Channel:** <#{channel_id}>\n"
+                        f"**Sent:** <t:{int(flag.timestamp.timestamp())}:R>\n"
+                        f"{links}"
+                    ),
+                    inline=False,
+                )
+            embed.set_footer(text=f"Page {index + 1}/{pages}")
+            return embed
+
+        await PaginationView(ctx, PageSource(pages, render)).start()
 
     # <--- User Lookup --->
 
@@ -1476,7 +2479,11 @@ class ModPlus(commands.Cog):
                     f"Being watched: {sm.is_being_watched}\n"
                     + (
                         f"Watchlist reason: {sm.watchlist_reason}\n"
-                        f"Watchlist expires : <t:{int(sm.watchlist_expiry.timestamp())}:R> (<t:{int(sm.watchlist_expires_at.timestamp())}:F>)"
+                        + (
+                            f"Watchlist expires : <t:{int(sm.watchlist_expiry.timestamp())}:R> (<t:{int(sm.watchlist_expiry.timestamp())}:F>)"
+                            if sm.watchlist_expiry
+                            else "Watchlist expires : Never"
+                        )
                         if sm.is_being_watched
                         else ""
                     )
@@ -1500,38 +2507,38 @@ class ModPlus(commands.Cog):
         guild_watchlist = await self._get_watchlist(ctx.guild.id)
 
         # filter out member ids that are no longer in guild
-        guild_watchlist: dict[int, dict[str, Union[str, datetime, None]]] = dict(
-            filter(lambda x: ctx.guild.get_member(x[0]) is not None, guild_watchlist.items())
-        )
+        entries: list[tuple[discord.Member, WatchlistEntry]] = [
+            (member, entry)
+            for user_id, entry in guild_watchlist.items()
+            if (member := ctx.guild.get_member(user_id)) is not None
+        ]
 
-        if not guild_watchlist:
+        if not entries:
             return await ctx.send("The watchlist is empty.")
 
-        fields = []
-        for user_id, data in guild_watchlist.items():
-            user = ctx.guild.get_member(user_id)
-            duration = (
-                f"<t:{int(data['duration'].timestamp())}:R>" if data["duration"] else "Never"
+        per_page = 6
+        pages = -(-len(entries) // per_page)
+
+        def render(index: int) -> discord.Embed:
+            embed = discord.Embed(
+                title=f"Watchlist for {ctx.guild.name}",
+                description=f"Total: {len(entries)}",
+                color=discord.Color.red(),
             )
-            fields.append(
-                dict(
+            embed.set_thumbnail(url=getattr(ctx.guild.icon, "url", None))
+            for user, data in entries[index * per_page : (index + 1) * per_page]:
+                duration = (
+                    f"<t:{int(data.expires_at.timestamp())}:R>" if data.expires_at else "Never"
+                )
+                embed.add_field(
                     name=f"{user.display_name} ({user.id})",
-                    value=f"**Reason:** {data['reason']}\n**Expires:** {duration}",
+                    value=f"**Reason:** {data.reason}\n**Expires:** {duration}",
                     inline=False,
                 )
-            )
-
-        embeds = await group_embeds_by_fields(
-            *fields,
-            per_embed=6,
-            page_in_footer=True,
-            title=f"Watchlist for {ctx.guild.name}",
-            description=f"Total: {len(guild_watchlist)}",
-            color=discord.Color.red().value,
-            thumbnail__url=getattr(ctx.guild.icon, "url", None),
-        )
+            embed.set_footer(text=f"Page {index + 1}/{pages}")
+            return embed
 
-        await PaginationView(ctx, embeds).start()
+        await PaginationView(ctx, PageSource(pages, render)).start()
 
     @watchlist.command(name="add")
     @commands.has_permissions(ban_members=True)
@@ -1,24 +1,27 @@
 from datetime import datetime, timedelta, timezone
-from typing import Optional, TYPE_CHECKING, Literal
+from typing import NamedTuple, Optional, TYPE_CHECKING, Literal, Tuple
 from dataclasses import dataclass
 from enum import Enum
 import logging
 import discord
-import hashlib
+import time
 from redbot.core import commands
+from .utils import DateConverter
 
 if TYPE_CHECKING:
     from .main import ModPlus as InfractionsCog
+    from .cache import WatchlistEntry
 
 log = logging.getLogger("red.jakey.modplus.models")
 
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
 
 class InfractionConverter(commands.Converter):
     async def convert(self, ctx: commands.Context, arg: str):
         user: discord.Member = ctx.args[-1]
-        print("ifc", user, arg)
-        sm = await ServerMember.from_member(ctx.cog, user)
-        inf = await sm.get_infraction(ctx.cog, arg)
+        inf = await ctx.cog._get_infraction(ctx.guild.id, user.id, arg)
         if inf is None:
             raise commands.BadArgument(f"Infraction `{arg}` not found.")
         return inf
@@ -44,13 +47,26 @@ class InfractionDetails(commands.FlagConverter):
             reason=self.reason,
             at=datetime.now(timezone.utc),
             duration=self.duration,
-            violator=sm,
+            violator=sm.ref,
             issuer_id=issuer_id,
+            # only used to preview messages, real ids are given out when an infraction is stored
+            id="0",
         )
 
         return infraction
 
 
+class InfractionSearchFlags(commands.FlagConverter, case_insensitive=True):
+    type: Tuple[Literal["ban", "kick", "mute", "warn", "tempban"], ...] = ()
+    user: Optional[discord.User] = None
+    issuer: Optional[discord.User] = None
+    within: Optional[commands.get_timedelta_converter()] = None
+    after: Optional[DateConverter] = None
+    before: Optional[DateConverter] = None
+    reason: Optional[str] = None
+    status: Optional[Literal["active", "expired"]] = None
+
+
 class InfractionType(Enum):
     BAN = "ban"
     KICK = "kick"
@@ -63,12 +79,31 @@ class InfractionType(Enum):
         return self in (InfractionType.MUTE, InfractionType.TEMPBAN)
 
 
-@dataclass
+INFRACTION_TYPES = {t.value: t for t in InfractionType}
+
+
+class MemberRef(NamedTuple):
+    """
+    The member an infraction belongs to.
+
+    Infractions only keep the ids rather than their `ServerMember`, so the cached ones don't keep
+    a member's whole infraction list and watchlist entry alive, or tie them to one loaded member.
+    """
+
+    guild_id: int
+    user_id: int
+
+
+@dataclass(slots=True)
 class ServerMember:
     guild_id: int
     user_id: int
     infractions: list["Infraction"]
-    watchlist: dict[str, str] | None
+    watchlist: Optional["WatchlistEntry"]
+
+    @property
+    def ref(self) -> MemberRef:
+        return MemberRef(self.guild_id, self.user_id)
 
     @property
     def is_being_watched(self):
@@ -76,13 +111,11 @@ class ServerMember:
 
     @property
     def watchlist_reason(self):
-        return self.watchlist["reason"] if self.is_being_watched else None
+        return self.watchlist.reason if self.is_being_watched else None
 
     @property
     def watchlist_expiry(self):
-        return (
-            datetime.fromisoformat(self.watchlist["duration"]) if self.is_being_watched else None
-        )
+        return self.watchlist.expires_at if self.is_being_watched else None
 
     @property
     def json(self):
@@ -94,21 +127,13 @@ class ServerMember:
 
     @classmethod
     async def from_ids(cls, cog: "InfractionsCog", guild_id: int, user_id: int):
-        self = cls(
+        return cls(
             guild_id=guild_id,
             user_id=user_id,
-            infractions=[],
+            infractions=list(await cog._get_infractions(guild_id, user_id)),
             watchlist=await cog._get_watchlist_status(guild_id, user_id),
         )
 
-        self.infractions = list(
-            map(
-                lambda infraction: (infraction, setattr(infraction, "violator", self))[0],
-                await cog._get_infractions(guild_id, user_id),
-            )
-        )
-        return self
-
     async def infraction(
         self,
         ctx: commands.Context,
@@ -127,7 +152,7 @@ class ServerMember:
             reason=reason,
             at=datetime.now(timezone.utc),
             duration=duration,
-            violator=self,
+            violator=self.ref,
             issuer_id=issuer_id,
         )
 
@@ -139,48 +164,97 @@ class ServerMember:
 
     async def delete_infraction(self, cog: "InfractionsCog", infraction: "Infraction"):
         await cog._remove_infraction(infraction)
-        self.infractions.remove(infraction)
+        # the infraction may have been looked up separately from this member's list, match by id
+        self.infractions = [x for x in self.infractions if x.id != infraction.id]
 
     async def clear_infractions(self, cog: "InfractionsCog"):
-        await cog._clear_infractions(self, self.user_id)
+        await cog._clear_infractions(self.guild_id, self.user_id)
         self.infractions.clear()
 
 
-@dataclass
 class Infraction:
+    """
+    A single infraction.
+
+    Times are kept as integer microseconds since the epoch (`at_us`, `duration_us`) so bulk
+    operations like expiry checks don't have to build datetimes. `at`, `duration` and
+    `lasts_until` build them on access.
+    """
+
+    __slots__ = ("type", "reason", "at_us", "duration_us", "violator", "issuer_id", "id")
+
     def __init__(
         self,
         type: InfractionType,
         reason: str,
         at: datetime,
         duration: Optional[timedelta],
-        violator: ServerMember,
+        violator: MemberRef,
         issuer_id: int,
         *,
         id: Optional[str] = None,
     ):
         self.type: InfractionType = type
         self.reason: str = reason
-        self.at: datetime = at
-        self.duration: Optional[timedelta] = duration
-        self.violator: ServerMember = violator
+        self.at_us: int = (at - EPOCH) // MICROSECOND
+        self.duration_us: Optional[int] = duration // MICROSECOND if duration else None
+        self.violator: MemberRef = violator
         self.issuer_id: int = issuer_id
-        self.id = id or self._generate_id()
+        # None until the infraction is stored, see `InfractionCache.add`
+        self.id: Optional[str] = id
 
-    def _generate_id(self):
-        timestamp = str(self.at.timestamp()).encode("utf-8")
-        hash_object = hashlib.sha256(timestamp)
-        hex_dig = hash_object.hexdigest()
-        short_hash = hex_dig[:8]
-        return short_hash
+    @classmethod
+    def from_timestamps(
+        cls,
+        type: InfractionType,
+        reason: str,
+        at_us: int,
+        duration_us: Optional[int],
+        violator: MemberRef,
+        issuer_id: int,
+        id: str,
+    ):
+        self = cls.__new__(cls)
+        self.type = type
+        self.reason = reason
+        self.at_us = at_us
+        self.duration_us = duration_us
+        self.violator = violator
+        self.issuer_id = issuer_id
+        self.id = id
+        return self
+
+    def __repr__(self):
+        return (
+            f"<Infraction id={self.id!r} type={self.type.value!r} "
+            f"user_id={self.violator.user_id}>"
+        )
+
+    @property
+    def at(self) -> datetime:
+        return EPOCH + self.at_us * MICROSECOND
+
+    @property
+    def duration(self) -> Optional[timedelta]:
+        return self.duration_us * MICROSECOND if self.duration_us else None
+
+    @property
+    def timestamp(self) -> int:
+        """The time this infraction was issued in seconds since the epoch."""
+        return self.at_us // 1_000_000
+
+    @property
+    def expires_at(self) -> Optional[int]:
+        """The time this infraction expires in seconds since the epoch."""
+        return (self.at_us + self.duration_us) // 1_000_000 if self.duration_us else None
 
     @property
     def lasts_until(self):
-        return self.at + self.duration if self.duration else None
+        return self.at + self.duration if self.duration_us else None
 
     @property
     def expired(self):
-        return self.lasts_until and self.lasts_until < datetime.now(timezone.utc)
+        return bool(self.duration_us) and self.at_us + self.duration_us < time.time_ns() // 1000
 
     @property
     def json(self):
@@ -189,18 +263,18 @@ class Infraction:
             "type": self.type.value,
             "reason": self.reason,
             "at": self.at.isoformat(),
-            "duration": self.duration.total_seconds() if self.duration else None,
+            "duration": self.duration_us / 1_000_000 if self.duration_us else None,
             "issuer_id": self.issuer_id,
         }
 
     @classmethod
-    def from_json(cls, json: dict, violator: ServerMember):
-        return cls(
-            type=InfractionType.__members__[json["type"].upper()],
-            reason=json["reason"],
-            at=datetime.fromisoformat(json["at"]),
-            duration=timedelta(seconds=json["duration"]) if json["duration"] else None,
-            issuer_id=json["issuer_id"],
-            violator=violator,
-            id=json["id"],
-        )
+    def from_json(cls, json: dict, violator: MemberRef):
+        self = cls.__new__(cls)
+        self.type = INFRACTION_TYPES[json["type"]]
+        self.reason = json["reason"]
+        self.at_us = round(datetime.fromisoformat(json["at"]).timestamp() * 1_000_000)
+        self.duration_us = round(json["duration"] * 1_000_000) if json["duration"] else None
+        self.violator = violator
+        self.issuer_id = json["issuer_id"]
+        self.id = json["id"]
+        return self
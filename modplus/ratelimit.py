@@ -0,0 +1,85 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+__all__ = ("GuildCooldown", "CooldownLimiter")
+
+
+class GuildCooldown:
+    """
+    One guild's flagging cooldown, a token bucket per user.
+
+    Each user's bucket is stored as the time it's next full (a theoretical arrival time), so a
+    check is one comparison and one addition. Users are kept in the order they were last let
+    through, which with a shared interval is also the order their buckets refill in: users at the
+    front whose bucket is full again are dropped for free, and past `max_users` the front user is
+    evicted even if their cooldown is still running.
+    """
+
+    __slots__ = ("interval", "burst", "max_users", "_ready", "hits", "drops", "evictions")
+
+    def __init__(self, interval: float, burst: int, max_users: int):
+        self.interval = interval
+        self.burst = burst
+        self.max_users = max_users
+        # user_id -> monotonic time at which their bucket is full again
+        self._ready: OrderedDict[int, float] = OrderedDict()
+        self.hits = 0
+        self.drops = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._ready)
+
+    def hit(self, user_id: int, now: float) -> bool:
+        """
+        Take a token from the user's bucket. Returns False if it's empty.
+        """
+        self.hits += 1
+        ready = max(self._ready.get(user_id, now), now)
+        if ready - now > (self.burst - 1) * self.interval:
+            self.drops += 1
+            return False
+
+        self._ready[user_id] = ready + self.interval
+        self._ready.move_to_end(user_id)
+
+        while self._ready:
+            user_id, ready = next(iter(self._ready.items()))
+            if ready <= now:
+                del self._ready[user_id]
+            elif len(self._ready) > self.max_users:
+                del self._ready[user_id]
+                self.evictions += 1
+            else:
+                break
+        return True
+
+
+class CooldownLimiter:
+    """
+    Flagging cooldowns keyed by guild id.
+
+    The interval is passed with every check, so a changed cooldown setting applies to the next
+    flag without the settings commands having to reach in here.
+    """
+
+    def __init__(self, max_users: int, burst: int = 1):
+        self.max_users = max_users
+        self.burst = burst
+        self._guilds: dict[int, GuildCooldown] = {}
+
+    def hit(self, guild_id: int, user_id: int, interval: float) -> bool:
+        if interval <= 0:
+            return True
+
+        cooldown = self._guilds.get(guild_id)
+        if cooldown is None:
+            cooldown = self._guilds[guild_id] = GuildCooldown(
+                interval, self.burst, self.max_users
+            )
+        cooldown.interval = interval
+        return cooldown.hit(user_id, time.monotonic())
+
+    def stats(self, guild_id: int) -> Optional[GuildCooldown]:
+        return self._guilds.get(guild_id)
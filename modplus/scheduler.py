@@ -0,0 +1,132 @@
+import asyncio
+import time
+from typing import NamedTuple
+from redbot.core import Config
+
+from .deadlines import DeadlineQueue
+
+__all__ = ("Expiry", "ExpiryScheduler")
+
+RETRY_DELAY = 60
+# seconds before the first retry of an expiry that couldn't be applied, doubled on every attempt
+
+MAX_RETRY_DELAY = 6 * 60 * 60
+
+
+class Expiry(NamedTuple):
+    deadline: float
+    guild_id: int
+    user_id: int
+    infraction_id: str
+    attempts: int = 0
+
+    @property
+    def key(self) -> tuple[int, str]:
+        return self.guild_id, self.infraction_id
+
+    @property
+    def json(self):
+        return {"deadline": self.deadline, "user_id": self.user_id, "attempts": self.attempts}
+
+
+class ExpiryScheduler:
+    """
+    A persistent queue of pending infraction expiries.
+
+    Every expiry is its own entry in the EXPIRIES custom group, so scheduling or finishing one only
+    writes that entry. `next_expired` sleeps until the earliest deadline and is woken early
+    whenever a sooner one is scheduled.
+
+    An expiry that was handed out stays stored until the caller reports it `done`, or puts it back
+    with `retry`, so one that was interrupted by a restart is picked up again on the next load.
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        # (guild_id, infraction_id) -> current expiry, including ones handed out but not done yet
+        self._pending: dict[tuple[int, str], Expiry] = {}
+        self._queue: DeadlineQueue[tuple[int, str]] = DeadlineQueue()
+        self._loaded = False
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _push(self, expiry: Expiry):
+        self._pending[expiry.key] = expiry
+        self._queue.schedule(expiry.key, expiry.deadline)
+
+    async def _write(self, expiry: Expiry):
+        await self.config.custom("EXPIRIES", *expiry.key).set(expiry.json)
+
+    async def load(self):
+        if self._loaded:
+            return
+
+        for guild_id, expiries in (await self.config.custom("EXPIRIES").all()).items():
+            for infraction_id, data in expiries.items():
+                expiry = Expiry(
+                    data["deadline"], int(guild_id), data["user_id"], infraction_id, data["attempts"]
+                )
+                # anything scheduled while loading is newer than what was read.
+                if expiry.key not in self._pending:
+                    self._push(expiry)
+        self._loaded = True
+
+    async def schedule(self, deadline: float, guild_id: int, user_id: int, infraction_id: str):
+        expiry = Expiry(deadline, guild_id, user_id, infraction_id)
+        self._push(expiry)
+        await self._write(expiry)
+
+    async def schedule_many(self, expiries: list[Expiry]):
+        for expiry in expiries:
+            self._push(expiry)
+        await asyncio.gather(*map(self._write, expiries))
+
+    async def done(self, expiry: Expiry):
+        """
+        Forget an expiry that was applied or no longer needs to be.
+        """
+        if self._pending.get(expiry.key) == expiry:
+            del self._pending[expiry.key]
+            self._queue.discard(expiry.key)
+            await self.config.custom("EXPIRIES", *expiry.key).clear()
+
+    async def move(self, guild_id: int, user_id: int, old_id: str, new_id: str):
+        """
+        Re-key the expiry of a member's infraction that was renumbered from `old_id` to `new_id`.
+
+        The entry is left alone if it belongs to another member, whose infraction kept the id.
+        """
+        await self.load()
+        old = self._pending.get((guild_id, old_id))
+        if old is None or old.user_id != user_id:
+            return
+
+        del self._pending[old.key]
+        self._queue.discard(old.key)
+        moved = old._replace(infraction_id=new_id)
+        self._push(moved)
+        await self._write(moved)
+        await self.config.custom("EXPIRIES", *old.key).clear()
+
+    async def retry(self, expiry: Expiry):
+        """
+        Put an expiry that couldn't be applied back, due again after an exponential backoff.
+        """
+        if self._pending.get(expiry.key) != expiry:
+            # rescheduled or finished while it was being applied
+            return
+
+        delay = min(RETRY_DELAY * 2**expiry.attempts, MAX_RETRY_DELAY)
+        retry = expiry._replace(deadline=time.time() + delay, attempts=expiry.attempts + 1)
+        self._push(retry)
+        await self._write(retry)
+
+    async def next_expired(self) -> Expiry:
+        """
+        Wait until the earliest scheduled expiry is due and return it.
+
+        It isn't handed out again unless it's passed to `retry`.
+        """
+        key = await self._queue.next_due()
+        return self._pending[key]
@@ -0,0 +1,167 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Iterator
+from .models import Infraction, InfractionType, MemberRef
+
+__all__ = ("ColumnarInfractionStore",)
+
+MAGIC = b"MPIF"
+VERSION = 1
+# magic, version, little endian?, row count, string count
+HEADER = struct.Struct("<4sBBxxQQ")
+
+TYPE_CODES = {t: code for code, t in enumerate(InfractionType)}
+TYPES = list(InfractionType)
+
+# (name, array typecode) in file order. 8 byte columns come first so every column stays aligned.
+COLUMNS = (
+    ("at", "q"),  # microseconds since the epoch
+    ("duration", "q"),  # microseconds, -1 for permanent
+    ("issuer", "Q"),
+    ("violator", "Q"),
+    ("id", "I"),  # index into the string table
+    ("reason", "I"),  # index into the string table
+    ("type", "B"),  # index into TYPES
+)
+
+
+class ColumnarInfractionStore:
+    """
+    Stores each guild's infractions as one binary file of fixed width columns.
+
+    Timestamps, durations, ids of the issuer and violator and the type are packed columns, ids and
+    reasons are interned into a string table at the end of the file. Files are read through mmap
+    and replaced atomically on save.
+
+    File layout::
+
+        header | at | duration | issuer | violator | string offsets | id | reason | type | strings
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _file(self, guild_id: int) -> Path:
+        return self.path / f"{guild_id}.bin"
+
+    def guild_ids(self) -> list[int]:
+        if not self.path.exists():
+            return []
+        return [int(p.stem) for p in self.path.glob("*.bin")]
+
+    def load_guild(self, guild_id: int) -> dict[int, list[Infraction]]:
+        path = self._file(guild_id)
+        if not path.exists() or not path.stat().st_size:
+            return {}
+
+        with path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return self._decode(memoryview(mm), guild_id)
+
+    def _decode(self, view: memoryview, guild_id: int) -> dict[int, list[Infraction]]:
+        magic, version, little, rows, string_count = HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{self._file(guild_id)} is not a version {VERSION} infraction file")
+
+        swap = bool(little) != (sys.byteorder == "little")
+        pos = HEADER.size
+
+        def take(typecode: str, count: int):
+            nonlocal pos
+            size = array(typecode).itemsize * count
+            column = view[pos : pos + size].cast(typecode)
+            pos += size
+            if swap:
+                column = array(typecode, column.tobytes())
+                column.byteswap()
+            return column
+
+        columns = {}
+        for name, typecode in COLUMNS[:4]:
+            columns[name] = take(typecode, rows)
+        offsets = take("Q", string_count + 1)
+        for name, typecode in COLUMNS[4:]:
+            columns[name] = take(typecode, rows)
+
+        blob = view[pos:]
+        strings = [
+            str(blob[offsets[i] : offsets[i + 1]], "utf-8") for i in range(string_count)
+        ]
+
+        members: dict[int, list[Infraction]] = {}
+        refs: dict[int, MemberRef] = {}
+        at, duration, issuer, violator, ids, reasons, types = (
+            columns[name] for name, _ in COLUMNS
+        )
+        for row in range(rows):
+            user_id = violator[row]
+            if (ref := refs.get(user_id)) is None:
+                ref = refs[user_id] = MemberRef(guild_id, user_id)
+                members[user_id] = []
+
+            members[user_id].append(
+                Infraction.from_timestamps(
+                    type=TYPES[types[row]],
+                    reason=strings[reasons[row]],
+                    at_us=at[row],
+                    duration_us=duration[row] if duration[row] >= 0 else None,
+                    violator=ref,
+                    issuer_id=issuer[row],
+                    id=strings[ids[row]],
+                )
+            )
+
+        for column in (*columns.values(), offsets):
+            if isinstance(column, memoryview):
+                column.release()
+        blob.release()
+        return members
+
+    def save_guild(self, guild_id: int, members: dict[int, list[Infraction]]):
+        path = self._file(guild_id)
+        infractions = [inf for infs in members.values() for inf in infs]
+        if not infractions:
+            path.unlink(missing_ok=True)
+            return
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            for chunk in self._encode(infractions):
+                f.write(chunk)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def delete_guild(self, guild_id: int):
+        self._file(guild_id).unlink(missing_ok=True)
+
+    def _encode(self, infractions: list[Infraction]) -> Iterator[bytes]:
+        strings: dict[str, int] = {}
+        columns = {name: array(typecode) for name, typecode in COLUMNS}
+        for inf in infractions:
+            columns["at"].append(inf.at_us)
+            columns["duration"].append(inf.duration_us or -1)
+            columns["issuer"].append(inf.issuer_id)
+            columns["violator"].append(inf.violator.user_id)
+            columns["id"].append(strings.setdefault(inf.id, len(strings)))
+            columns["reason"].append(strings.setdefault(inf.reason, len(strings)))
+            columns["type"].append(TYPE_CODES[inf.type])
+
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = array("Q", [0])
+        for s in encoded:
+            offsets.append(offsets[-1] + len(s))
+
+        yield HEADER.pack(
+            MAGIC, VERSION, sys.byteorder == "little", len(infractions), len(encoded)
+        )
+        for name, _ in COLUMNS[:4]:
+            yield columns[name].tobytes()
+        yield offsets.tobytes()
+        for name, _ in COLUMNS[4:]:
+            yield columns[name].tobytes()
+        yield b"".join(encoded)
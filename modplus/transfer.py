@@ -0,0 +1,65 @@
+import csv
+import json
+from pathlib import Path
+from typing import IO, Iterable, Iterator, Literal, Optional
+from .models import Infraction, MemberRef
+
+__all__ = (
+    "FIELDS",
+    "TransferFormat",
+    "format_for",
+    "to_record",
+    "write_records",
+    "read_records",
+)
+
+TransferFormat = Literal["jsonl", "csv"]
+
+FIELDS = ("id", "user_id", "type", "reason", "at", "duration", "issuer_id")
+# one record per infraction, `Infraction.json` plus the id of the member it was given to
+
+
+def format_for(path: Path) -> Optional[TransferFormat]:
+    return {".jsonl": "jsonl", ".csv": "csv"}.get(path.suffix.lower())
+
+
+def to_record(infraction: Infraction) -> dict:
+    return {"user_id": infraction.violator.user_id, **infraction.json}
+
+
+def write_records(f: IO[str], fmt: TransferFormat, records: Iterable[dict], header: bool):
+    if fmt == "jsonl":
+        f.writelines(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        return
+
+    writer = csv.DictWriter(f, FIELDS)
+    if header:
+        writer.writeheader()
+    writer.writerows(records)
+
+
+def read_records(f: IO[str], fmt: TransferFormat, guild_id: int) -> Iterator[Infraction]:
+    """
+    Yield an infraction for each record in `f`, reading one line at a time.
+
+    Raises ValueError for a record that can't be read.
+    """
+    if fmt == "jsonl":
+        rows = (json.loads(line) for line in f if line.strip())
+    else:
+        rows = csv.DictReader(f)
+
+    for row in rows:
+        try:
+            data = {
+                "id": str(row["id"]) if row.get("id") not in (None, "") else None,
+                "type": row["type"],
+                "reason": row["reason"],
+                "at": row["at"],
+                "duration": float(row["duration"]) if row.get("duration") else None,
+                "issuer_id": int(row["issuer_id"]),
+            }
+            violator = MemberRef(guild_id, int(row["user_id"]))
+            yield Infraction.from_json(data, violator)
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Invalid record {row!r}") from e
@@ -1,9 +1,10 @@
 from redbot.core import commands
+from datetime import datetime, timezone
 import emoji
 import discord
 from typing import Union
 
-__all__ = ("timedelta_converter", "EmojiConverter", "group_embeds_by_fields")
+__all__ = ("timedelta_converter", "EmojiConverter", "DateConverter", "group_embeds_by_fields")
 
 timedelta_converter = commands.get_timedelta_converter(
     allowed_units=["minutes", "weeks", "days", "hours"]
@@ -24,6 +25,18 @@ class EmojiConverter(commands.EmojiConverter):
             return arg
 
 
+class DateConverter(commands.Converter):
+    """
+    Converts a `YYYY-MM-DD` date to midnight UTC on that day.
+    """
+
+    async def convert(self, ctx: commands.Context, arg: str):
+        try:
+            return datetime.strptime(arg.strip(), "%Y-%m-%d").replace(tzinfo=timezone.utc)
+        except ValueError:
+            raise commands.BadArgument(f"`{arg}` is not a date in the `YYYY-MM-DD` format.")
+
+
 async def group_embeds_by_fields(
     *fields: dict[str, Union[str, bool]],
     per_embed: int = 3,
@@ -1,7 +1,19 @@
 from discord.interactions import Interaction
 from discord.ui import Button, Select, View, button, select
 from redbot.core import commands
-from typing import List, Optional, Union, Callable, Coroutine, Any, TYPE_CHECKING
+from collections import OrderedDict
+from typing import (
+    List,
+    Optional,
+    Union,
+    Callable,
+    Coroutine,
+    Any,
+    Awaitable,
+    NamedTuple,
+    TYPE_CHECKING,
+)
+import inspect
 import discord
 from redbot.core.bot import Red
 from .models import Infraction
@@ -45,6 +57,16 @@ async def interaction_check(ctx: commands.Context, interaction: discord.Interact
     return True
 
 
+def _embed_state(embed: discord.Embed) -> tuple:
+    # what a re-render of a flag alert can change
+    return (
+        embed.description,
+        embed.colour and embed.colour.value,
+        [(f.name, f.value, f.inline) for f in embed.fields],
+        embed.footer.text,
+    )
+
+
 class CloseButton(Button):
     def __init__(self):
         super().__init__(style=discord.ButtonStyle.red, label="Close", emoji="❎")
@@ -102,6 +124,60 @@ class YesOrNoView(ViewDisableOnTimeout):
 
 # <-------------------Paginaion Stuff Below------------------->
 
+Page = Union[str, discord.Embed]
+
+
+class PageSource:
+    """
+    Pages that are only rendered when they're shown.
+
+    `render` is called with a page index and returns the page or an awaitable of it. The last
+    `cache_size` rendered pages are kept so flipping back and forth doesn't render them again.
+    """
+
+    def __init__(
+        self,
+        length: int,
+        render: Callable[[int], Union[Page, Awaitable[Page]]],
+        cache_size: int = 5,
+    ):
+        self.length = length
+        self.render = render
+        self.cache_size = cache_size
+        self._cache: OrderedDict[int, Page] = OrderedDict()
+
+    def __len__(self):
+        return self.length
+
+    def clear(self):
+        self._cache.clear()
+
+    def remove(self, index: int):
+        """
+        Drop a page that no longer exists. The cached pages after it move back by one.
+        """
+        self.length -= 1
+        self._cache = OrderedDict(
+            (i - (i > index), page) for i, page in self._cache.items() if i != index
+        )
+
+    async def get(self, index: int) -> Page:
+        try:
+            self._cache.move_to_end(index)
+            return self._cache[index]
+        except KeyError:
+            pass
+
+        page = self.render(index)
+        if inspect.isawaitable(page):
+            page = await page
+
+        if self.cache_size:
+            self._cache[index] = page
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return page
+
 
 class PaginatorButton(Button):
     def __init__(self, *, emoji=None, label=None):
@@ -184,23 +260,42 @@ class PaginationView(ViewDisableOnTimeout):
     def __init__(
         self,
         context: commands.Context,
-        contents: Union[List[str], List[discord.Embed]],
+        contents: Union[List[str], List[discord.Embed], PageSource],
         timeout: int = 30,
         use_select: bool = False,
     ):
         super().__init__(timeout=timeout, ctx=context, timeout_message=None)
 
         self.ctx = context
-        self.contents = contents
         self.use_select = use_select
         self.index = 0
-        if not all(isinstance(x, discord.Embed) for x in contents) and not all(
-            isinstance(x, str) for x in contents
-        ):
-            raise TypeError("All pages must be of the same type. Either a string or an embed.")
+        if not isinstance(contents, PageSource):
+            if not all(isinstance(x, discord.Embed) for x in contents) and not all(
+                isinstance(x, str) for x in contents
+            ):
+                raise TypeError(
+                    "All pages must be of the same type. Either a string or an embed."
+                )
+            # already rendered, nothing to cache
+            contents = PageSource(len(contents), contents.__getitem__, cache_size=0)
+
+        self.contents = contents
+        self._add_navigation()
+
+    def _add_navigation(self):
+        # which buttons and select options there are depends on the number of pages, items
+        # subclasses added stay after them.
+        extra = [
+            i
+            for i in self.children
+            if not isinstance(i, (PaginatorSelect, PaginatorButton, PageButton, CloseButton))
+        ]
+        self.clear_items()
 
         if self.use_select and len(self.contents) > 1:
-            self.add_item(PaginatorSelect(placeholder="Select a page:", length=len(contents)))
+            self.add_item(
+                PaginatorSelect(placeholder="Select a page:", length=len(self.contents))
+            )
 
         buttons_to_add = (
             [FirstItemButton, BackwardButton, PageButton, ForwardButton, LastItemButton]
@@ -213,8 +308,18 @@ class PaginationView(ViewDisableOnTimeout):
             self.add_item(i())
 
         self.add_item(CloseButton())
+        for item in extra:
+            self.add_item(item)
         self.update_items()
 
+    def remove_page(self, index: int):
+        """
+        Take a page out, e.g. after what it showed was deleted, and rebuild the navigation.
+        """
+        self.contents.remove(index)
+        self.index = max(min(self.index, len(self.contents) - 1), 0)
+        self._add_navigation()
+
     def update_items(self):
         for i in self.children:
             if isinstance(i, PageButton):
@@ -232,29 +337,20 @@ class PaginationView(ViewDisableOnTimeout):
             i.disabled = False
 
     async def start(self):
-        if isinstance(self.contents[self.index], discord.Embed):
-            embed = self.contents[self.index]
-            content = ""
-        elif isinstance(self.contents[self.index], str):
-            embed = None
-            content = self.contents[self.index]
+        content, embed = await self.current_page()
         self.message = await self.ctx.send(content=content, embed=embed, view=self)
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         return await interaction_check(self.ctx, interaction)
 
-    def current_page(self) -> tuple[str, Optional[discord.Embed]]:
-        if isinstance(self.contents[self.index], discord.Embed):
-            embed = self.contents[self.index]
-            content = ""
-        elif isinstance(self.contents[self.index], str):
-            embed = None
-            content = self.contents[self.index]
-
-        return content, embed
+    async def current_page(self) -> tuple[str, Optional[discord.Embed]]:
+        page = await self.contents.get(self.index)
+        if isinstance(page, discord.Embed):
+            return "", page
+        return page, None
 
     async def edit_message(self, inter: discord.Interaction):
-        content, embed = self.current_page()
+        content, embed = await self.current_page()
 
         self.update_items()
         await inter.response.edit_message(content=content, embed=embed, view=self)
@@ -275,9 +371,7 @@ class InfractionDeleteButton(Button):
     async def callback(self, inter: discord.Interaction):
         cog = self.view.cog
 
-        sm = self.infraction.violator
-
-        await sm.delete_infraction(cog, self.infraction)
+        await cog._remove_infraction(self.infraction)
 
         await self.after_delete(self, inter)
 
@@ -301,16 +395,22 @@ class InfractionView(ViewDisableOnTimeout):
 
 
 class InfractionPagination(PaginationView):
+    """
+    Pages through a member's infractions, one per page, rendering each with `render` when shown.
+    """
+
     def __init__(
         self,
         ctx: commands.Context,
-        contents: List[discord.Embed],
         infractions: List[Infraction],
+        render: Callable[[Infraction], discord.Embed],
         timeout: int = 30,
     ):
         self.infractions = infractions
-        super().__init__(ctx, contents, timeout)
-        self.add_item(InfractionDeleteButton(self._get_infraction(0), self.delete))
+        source = PageSource(len(infractions), lambda index: render(self.infractions[index]))
+        super().__init__(ctx, source, timeout)
+        self.delete_button = InfractionDeleteButton(self._get_infraction(0), self.delete)
+        self.add_item(self.delete_button)
 
     def _get_infraction(self, index: Optional[int] = None) -> Infraction:
         return self.infractions[self.index if index is None else index]
@@ -320,15 +420,23 @@ class InfractionPagination(PaginationView):
         return self.ctx.cog
 
     async def edit_message(self, inter: Interaction):
+        self.delete_button.infraction = self._get_infraction()
         await super().edit_message(inter)
-        self.children[0].infraction = self._get_infraction()
 
     @staticmethod
     async def delete(self: InfractionDeleteButton, inter: discord.Interaction):
-        self.view.contents.remove(self.view.contents[self.view.index])
-        await inter.response.edit_message(
-            content="Infraction deleted.", embed=None, view=self.view
-        )
+        view: InfractionPagination = self.view
+        view.infractions.pop(view.index)
+        if not view.infractions:
+            view.stop()
+            return await inter.response.edit_message(
+                content="Infraction deleted.", embed=None, view=None
+            )
+
+        view.remove_page(view.index)
+        self.infraction = view._get_infraction()
+        _, embed = await view.current_page()
+        await inter.response.edit_message(content="Infraction deleted.", embed=embed, view=view)
 
 
 class ActionSelectView(ViewDisableOnTimeout):
@@ -391,6 +499,14 @@ class ActionSelectView(ViewDisableOnTimeout):
         await inter.response.send_message("Action completed.")
 
 
+class FlagContext(NamedTuple):
+    channel_id: int
+    message_id: int
+    # the buffered FLAGGED record, or the archived copy if `archived`
+    record: dict
+    archived: bool
+
+
 class FlaggingView(View):
     def __init__(self, bot: Red):
         self.bot = bot
@@ -407,48 +523,63 @@ class FlaggingView(View):
 
         await interaction.response.defer(ephemeral=True)
 
-        channel_id, message_id = self.get_ids_from_embed(interaction.message.embeds[0])
-
-        data = await self.cog.config.custom(
-            "FLAGGED", interaction.guild_id, channel_id, message_id
-        ).all()
-
-        embed = self.cog._create_flag_embed(
-                interaction.guild.id,
-                channel_id,
-                message_id,
-                data["flagged_by"],
-                data["author_id"],
-                data["content"],
-                data["reporters"],
-        )
-
-        if interaction.data["custom_id"] == "clear_flag":
-            embed.color = discord.Color.green()
-
-        await interaction.message.edit(
-            embed=embed,
-            view=self,
-        )
-
-        if not (
-            cond := interaction.user.get_role(
-                await self.cog.config.guild(interaction.guild).flagging.mod_role()
+        if (
+            interaction.user.get_role(
+                (await self.cog.settings_cache.get(interaction.guild_id))["flagging"]["mod_role"]
             )
-            is not None
+            is None
         ):
             await interaction.followup.send(
                 "You are not allowed to perform this action.", ephemeral=True
             )
+            return False
 
-        return cond
+        context = await self.load_context(interaction)
+        if context is None:
+            await interaction.followup.send(
+                "The record of this flagged message could not be found.", ephemeral=True
+            )
+            return False
+
+        # loaded once here and read by the button handler
+        interaction.extras["flag"] = context
+        if interaction.data["custom_id"] != "clear_flag":
+            # clearing refreshes the message itself once the record has changed
+            await self.refresh(interaction, context)
+        return True
 
     def get_ids_from_embed(self, embed: discord.Embed):
         ids = embed.footer.text.split("-")
         return int(ids[0]), int(ids[1])
 
-    async def get_message_details(self, guild_id: int, channel_id: int, message_id: int):
-        return await self.cog.config.custom("FLAGGED", guild_id, channel_id, message_id).all()
+    async def load_context(self, interaction: discord.Interaction) -> Optional[FlagContext]:
+        channel_id, message_id = self.get_ids_from_embed(interaction.message.embeds[0])
+        key = (interaction.guild_id, channel_id, message_id)
+        if record := await self.cog.flag_store.get(*key):
+            return FlagContext(channel_id, message_id, record, False)
+        if record := await self.cog.flag_store.archive.get(key):
+            return FlagContext(channel_id, message_id, record, True)
+        return None
+
+    async def refresh(self, interaction: discord.Interaction, context: FlagContext):
+        """
+        Re-render the alert from the record, editing the message only if that changed anything.
+        """
+        record = context.record
+        embed = self.cog._create_flag_embed(
+            interaction.guild_id,
+            context.channel_id,
+            context.message_id,
+            record["flagged_by"],
+            record["author_id"],
+            record["content"],
+            record["reporters"],
+        )
+        if record.get("cleared"):
+            embed.color = discord.Color.green()
+
+        if _embed_state(embed) != _embed_state(interaction.message.embeds[0]):
+            await interaction.message.edit(embed=embed, view=self)
 
     @button(
         label="Delete Original Message",
@@ -457,8 +588,8 @@ class FlaggingView(View):
         custom_id="delete_org_msg",
     )
     async def delete_original(self, inter: discord.Interaction, button: discord.ui.Button):
-        channel_id, message_id = self.get_ids_from_embed(inter.message.embeds[0])
-        channel = inter.client.get_channel(channel_id)
+        context: FlagContext = inter.extras["flag"]
+        channel = inter.client.get_channel(context.channel_id)
 
         if not channel:
             await inter.followup.send(
@@ -466,7 +597,7 @@ class FlaggingView(View):
             )
 
         try:
-            message = discord.PartialMessage(channel=channel, id=message_id)
+            message = discord.PartialMessage(channel=channel, id=context.message_id)
             await message.delete()
 
         except discord.NotFound:
@@ -482,10 +613,7 @@ class FlaggingView(View):
         label="Take Action", style=discord.ButtonStyle.blurple, emoji="🛡️", custom_id="take_action"
     )
     async def take_action(self, inter: discord.Interaction, button: discord.ui.Button):
-        channel_id, message_id = self.get_ids_from_embed(inter.message.embeds[0])
-        details = await self.get_message_details(inter.guild_id, channel_id, message_id)
-
-        author_id = details["author_id"]
+        author_id = inter.extras["flag"].record["author_id"]
 
         guild = inter.client.get_guild(inter.guild_id)
 
@@ -505,16 +633,23 @@ class FlaggingView(View):
 
     @button(label="Clear Flag", style=discord.ButtonStyle.green, emoji="🚩", custom_id="clear_flag")
     async def clear_flag(self, inter: discord.Interaction, button: discord.ui.Button):
-        channel_id, message_id = self.get_ids_from_embed(inter.message.embeds[0])
-        if await self.cog.config.custom("FLAGGED", inter.guild_id, channel_id, message_id).get_raw(
-            "cleared", default=False
-        ):
+        context: FlagContext = inter.extras["flag"]
+        if context.archived:
+            await self.refresh(inter, context)
+            return await inter.followup.send(
+                "This flag has been archived and can no longer be changed.", ephemeral=True
+            )
+
+        if context.record.get("cleared", False):
+            await self.refresh(inter, context)
             return await inter.followup.send(
                 "This message has already been cleared.", ephemeral=True
             )
-        await self.cog.config.custom("FLAGGED", inter.guild_id, channel_id, message_id).set_raw(
-            "cleared", value=True
+        # updates the buffered record in place, so the context sees it too
+        self.cog.flag_store.update(
+            (inter.guild_id, context.channel_id, context.message_id), cleared=True
         )
+        await self.refresh(inter, context)
         await inter.followup.send("Flag cleared.", ephemeral=True)
 
     @button(
@@ -524,11 +659,7 @@ class FlaggingView(View):
         custom_id="list_reporters",
     )
     async def list_reporters(self, inter: discord.Interaction, button: discord.ui.Button):
-        channel_id, message_id = self.get_ids_from_embed(inter.message.embeds[0])
-
-        reporters = await self.cog.config.custom(
-            "FLAGGED", inter.guild_id, channel_id, message_id
-        ).get_raw("reporters", default=[])
+        reporters = inter.extras["flag"].record.get("reporters", [])
 
         embed = discord.Embed(
             title="List of Reporters",
@@ -546,8 +677,7 @@ class FlaggingView(View):
         custom_id="show_full_content",
     )
     async def show_content(self, inter: discord.Interaction, button: discord.ui.Button):
-        channel_id, message_id = self.get_ids_from_embed(inter.message.embeds[0])
-        details = await self.get_message_details(inter.guild_id, channel_id, message_id)
+        details = inter.extras["flag"].record
 
         embed = discord.Embed(
             title=f"Full Message Content",
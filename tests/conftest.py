@@ -0,0 +1,153 @@
+import copy
+from typing import Any, Optional
+import pytest
+from modplus.cache import InfractionCache
+
+MEMBER_DEFAULTS = {"infractions": [], "watchlist": None}
+# custom group -> (number of identifiers, defaults)
+CUSTOM_GROUPS = {
+    "INFRACTION_IDS": (1, {"last": 0}),
+    "EXPIRIES": (2, {"deadline": None, "user_id": None, "attempts": 0}),
+    "INFRACTIONS": (1, {"members": {}}),
+    "FLAGGED": (3, {}),
+}
+GLOBAL_DEFAULTS = {
+    "infraction_backend": "config",
+    "infractions_migrated": False,
+    "appeal_invites": {},
+}
+
+
+class FakeValue:
+    def __init__(self, config: "FakeConfig", path: tuple, default: Any):
+        self.config = config
+        self.path = path
+        self.default = default
+
+    async def __call__(self):
+        return copy.deepcopy(self.config.store.get(self.path, self.default))
+
+    async def set(self, value: Any):
+        self.config.writes.append(self.path)
+        self.config.store[self.path] = copy.deepcopy(value)
+
+    async def clear(self):
+        self.config.writes.append(self.path)
+        self.config.store.pop(self.path, None)
+
+
+class FakeGroup:
+    def __init__(self, config: "FakeConfig", path: tuple, defaults: dict):
+        self._config = config
+        self._path = path
+        self._defaults = defaults
+
+    def __getattr__(self, name: str) -> FakeValue:
+        if name.startswith("_") or name not in self._defaults:
+            raise AttributeError(name)
+        return FakeValue(self._config, (*self._path, name), self._defaults[name])
+
+    async def all(self) -> dict:
+        return {
+            key: copy.deepcopy(self._config.store.get((*self._path, key), default))
+            for key, default in self._defaults.items()
+        }
+
+    async def set(self, value: dict):
+        await self.clear()
+        for key, item in value.items():
+            await getattr(self, key).set(item)
+
+    async def clear(self):
+        self._config.writes.append(self._path)
+        for path in [p for p in self._config.store if p[: len(self._path)] == self._path]:
+            del self._config.store[path]
+
+
+class FakeParentGroup:
+    """
+    A custom group with only some of its identifiers given.
+    """
+
+    def __init__(self, config: "FakeConfig", path: tuple, depth: int, defaults: dict):
+        self._config = config
+        self._path = path
+        self._depth = depth
+        self._defaults = defaults
+
+    async def all(self) -> dict:
+        nested: dict = {}
+        for path, value in self._config.store.items():
+            if path[: len(self._path)] != self._path or len(path) != self._depth + 2:
+                continue
+            *identifiers, key = path[len(self._path) :]
+            entry = nested
+            for identifier in identifiers:
+                entry = entry.setdefault(identifier, {})
+            if not entry:
+                entry.update(copy.deepcopy(self._defaults))
+            entry[key] = copy.deepcopy(value)
+        return nested
+
+
+class FakeConfig:
+    """
+    Just enough of Red's Config for the caches: member, custom group and global values, stored
+    in a flat dict keyed by their identifiers, with every write recorded.
+    """
+
+    def __init__(self):
+        self.store: dict[tuple, Any] = {}
+        self.writes: list[tuple] = []
+
+    def custom(self, name: str, *identifiers):
+        depth, defaults = CUSTOM_GROUPS[name]
+        path = (name, *map(str, identifiers))
+        if len(identifiers) < depth:
+            return FakeParentGroup(self, path, depth, defaults)
+        return FakeGroup(self, path, defaults)
+
+    def member_from_ids(self, guild_id: int, user_id: int) -> FakeGroup:
+        return FakeGroup(self, ("MEMBER", str(guild_id), str(user_id)), MEMBER_DEFAULTS)
+
+    async def all_members(self, guild: Optional[Any] = None) -> dict:
+        members: dict = {}
+        for path, value in self.store.items():
+            if path[0] == "MEMBER" and (guild is None or path[1] == str(guild.id)):
+                members.setdefault(int(path[1]), {}).setdefault(
+                    int(path[2]), dict(MEMBER_DEFAULTS)
+                )[path[3]] = copy.deepcopy(value)
+        return members if guild is None else members.get(guild.id, {})
+
+    def __getattr__(self, name: str) -> FakeValue:
+        if name not in GLOBAL_DEFAULTS:
+            raise AttributeError(name)
+        return FakeValue(self, ("GLOBAL", name), GLOBAL_DEFAULTS[name])
+
+
+class FakeCog:
+    """
+    The cog methods the models call, backed by a real InfractionCache.
+    """
+
+    def __init__(self, config: FakeConfig):
+        self.infraction_cache = InfractionCache(config, None)
+
+    async def _get_infractions(self, guild_id: int, user_id: int):
+        return await self.infraction_cache.get_infractions(guild_id, user_id)
+
+    async def _remove_infraction(self, infraction) -> bool:
+        return await self.infraction_cache.remove(infraction)
+
+    async def _get_watchlist_status(self, guild_id: int, user_id: int):
+        return None
+
+
+@pytest.fixture
+def config() -> FakeConfig:
+    return FakeConfig()
+
+
+@pytest.fixture
+def cog(config: FakeConfig) -> FakeCog:
+    return FakeCog(config)
@@ -0,0 +1,94 @@
+import asyncio
+from types import SimpleNamespace
+import discord
+from modplus.automod import AutomodRules, AutomodWindows
+from modplus.cache import SnapshotCache
+from modplus.main import ModPlus
+from modplus.models import InfractionType
+from modplus.scheduler import ExpiryScheduler
+from test_infractions import GUILD_ID, USER_ID, make_infraction, store_infractions
+
+
+class FakeSettings:
+    def __init__(self, automod: dict):
+        self.settings = {"automod": automod}
+
+    async def get(self, guild_id: int) -> dict:
+        return self.settings
+
+
+class FakeMember:
+    def __init__(self, fail: bool = False):
+        self.id = USER_ID
+        self.top_role = 1
+        self.fail = fail
+        self.timeouts = []
+
+    async def timeout(self, duration, *, reason: str):
+        if self.fail:
+            raise discord.HTTPException(SimpleNamespace(status=403, reason="Forbidden"), "")
+        self.timeouts.append(duration)
+
+
+def make_cog(config, cog, automod: dict) -> ModPlus:
+    """
+    A ModPlus with just what automod uses, messages are dropped.
+    """
+    modplus = ModPlus.__new__(ModPlus)
+    modplus.infraction_cache = cog.infraction_cache
+    modplus.expiry_scheduler = ExpiryScheduler(config)
+    modplus.settings_cache = FakeSettings(automod)
+    modplus.automod_cache = SnapshotCache(AutomodRules)
+    modplus.automod_windows = AutomodWindows(100)
+    modplus._infraction_seeds = lambda guild, infraction: {}
+    modplus._get_watchlist_status = cog._get_watchlist_status
+
+    async def drop(*coros):
+        for coro in coros:
+            coro.close()
+
+    modplus._run_sinks = drop
+    return modplus
+
+
+def make_guild(member: FakeMember):
+    member.guild = SimpleNamespace(
+        id=GUILD_ID,
+        owner=None,
+        me=SimpleNamespace(id=1, top_role=2),
+        get_member=lambda user_id: member if user_id == member.id else None,
+    )
+    return member.guild
+
+
+def warns(count: int) -> list:
+    return [make_infraction(str(i)) for i in range(1, count + 1)]
+
+
+def test_warn_threshold_acts_once(config, cog):
+    store_infractions(config, USER_ID, warns(3))
+    member = FakeMember()
+    modplus = make_cog(config, cog, {"3": "mute 3600"})
+
+    async def main():
+        await modplus._check_automod(make_guild(member), None, USER_ID, "warn")
+        # a moderator muting someone at a threshold doesn't trigger it either
+        await modplus._check_automod(make_guild(member), None, USER_ID, "mute")
+        return await cog.infraction_cache.get_infractions(GUILD_ID, USER_ID)
+
+    infractions = asyncio.run(main())
+    assert len(member.timeouts) == 1
+    assert [inf.type for inf in infractions].count(InfractionType.MUTE) == 1
+
+
+def test_failed_automod_action_is_not_kept(config, cog):
+    store_infractions(config, USER_ID, warns(3))
+    member = FakeMember(fail=True)
+    modplus = make_cog(config, cog, {"3": "mute 3600"})
+
+    async def main():
+        await modplus._check_automod(make_guild(member), None, USER_ID, "warn")
+        return await cog.infraction_cache.get_infractions(GUILD_ID, USER_ID)
+
+    infractions = asyncio.run(main())
+    assert [inf.type for inf in infractions] == [InfractionType.WARN] * 3
@@ -0,0 +1,35 @@
+import asyncio
+import time
+import pytest
+from modplus.deadlines import DeadlineQueue
+
+
+def test_moved_and_discarded_keys_are_skipped():
+    async def main():
+        queue = DeadlineQueue()
+        now = time.time()
+        queue.schedule("a", now - 3)
+        queue.schedule("b", now - 2)
+        queue.schedule("c", now - 1)
+        queue.schedule("a", now + 3600)
+        queue.discard("b")
+
+        assert await queue.next_due() == "c"
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(queue.next_due(), 0.05)
+        return queue
+
+    queue = asyncio.run(main())
+    assert list(queue._deadlines) == ["a"]
+
+
+def test_sooner_deadline_wakes_the_waiter():
+    async def main():
+        queue = DeadlineQueue(time.monotonic)
+        queue.schedule(1, time.monotonic() + 3600)
+        waiter = asyncio.ensure_future(queue.next_due())
+        await asyncio.sleep(0)
+        queue.schedule(2, time.monotonic())
+        return await asyncio.wait_for(waiter, 1)
+
+    assert asyncio.run(main()) == 2
@@ -0,0 +1,133 @@
+import asyncio
+import random
+from datetime import datetime, timezone
+from types import SimpleNamespace
+import discord
+from modplus.flags import FlagArchive, FlaggedStore, FlagLocks, MessageCache
+from modplus.main import ModPlus
+from modplus.ratelimit import CooldownLimiter
+from test_automod import FakeSettings
+
+
+class SlowChannel:
+    def __init__(self):
+        self.fetches = 0
+        self.release = asyncio.Event()
+
+    async def fetch_message(self, message_id: int):
+        self.fetches += 1
+        await self.release.wait()
+        return SimpleNamespace(
+            id=message_id,
+            author=SimpleNamespace(id=10),
+            content="hi",
+            created_at=datetime.now(timezone.utc),
+        )
+
+
+def test_cancelling_the_first_waiter_keeps_the_shared_fetch():
+    async def main():
+        cache = MessageCache(10)
+        channel = SlowChannel()
+        first = asyncio.ensure_future(cache.fetch(channel, 1))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(cache.fetch(channel, 1))
+        await asyncio.sleep(0)
+
+        first.cancel()
+        await asyncio.sleep(0)
+        channel.release.set()
+        return channel, await asyncio.wait_for(second, 1)
+
+    channel, snapshot = asyncio.run(main())
+    assert channel.fetches == 1
+    assert snapshot.content == "hi"
+
+
+class FlagChannel:
+    """
+    The flag channel, recording alerts and pings. Sending yields, so reactions interleave.
+    """
+
+    type = discord.ChannelType.text
+    _state = None
+
+    def __init__(self):
+        self.alerts = []
+        self.pings = []
+
+    async def send(self, content=None, *, embed=None, reference=None, **kwargs):
+        await asyncio.sleep(0)
+        if embed is not None:
+            self.alerts.append(embed)
+            return SimpleNamespace(id=len(self.alerts))
+        self.pings.append(reference.id)
+
+
+class ReactedChannel(SlowChannel):
+    def get_partial_message(self, message_id: int):
+        async def clear_reaction(emoji):
+            await asyncio.sleep(0)
+
+        return SimpleNamespace(clear_reaction=clear_reaction)
+
+
+def test_concurrent_reactions_flag_each_message_once(config, tmp_path):
+    messages, reporters, threshold = 20, 200, 50
+    fc = FlagChannel()
+    channel = ReactedChannel()
+    channel.release.set()
+    guild = SimpleNamespace(
+        id=1, get_channel=lambda _: fc, get_channel_or_thread=lambda _: channel, get_member=None
+    )
+    flagging = {
+        "emoji": "🚩",
+        "channel": 2,
+        "mod_role": 3,
+        "ping_threshold": threshold,
+        "cooldown": 0,
+    }
+
+    modplus = ModPlus.__new__(ModPlus)
+    modplus.bot = SimpleNamespace(get_guild=lambda _: guild)
+    modplus.settings_cache = FakeSettings({})
+    modplus.settings_cache.settings["flagging"] = flagging
+    modplus.flag_store = FlaggedStore(config, FlagArchive(tmp_path / "flags.jsonl"))
+    modplus.flag_locks = FlagLocks()
+    modplus.flag_cooldowns = CooldownLimiter(reporters)
+    modplus.flag_messages = MessageCache(messages)
+    modplus.flagging_view = None
+
+    async def no_automod(*args):
+        pass
+
+    modplus._check_automod = no_automod
+
+    def reaction(message_id: int, user_id: int):
+        return SimpleNamespace(
+            guild_id=1,
+            channel_id=4,
+            message_id=message_id,
+            user_id=user_id,
+            emoji="🚩",
+            member=SimpleNamespace(id=user_id),
+        )
+
+    # everyone reacts to every message twice, all at once
+    payloads = [
+        reaction(message_id, user_id)
+        for message_id in range(messages)
+        for user_id in range(reporters)
+    ] * 2
+    random.Random(0).shuffle(payloads)
+
+    async def main():
+        await asyncio.gather(*map(modplus.on_raw_reaction_add, payloads))
+
+    asyncio.run(main())
+    assert len(fc.alerts) == messages
+    assert sorted(fc.pings) == list(range(1, messages + 1))
+    for message_id in range(messages):
+        record = modplus.flag_store._records[(1, 4, message_id)]
+        assert sorted(record["reporters"]) == list(range(reporters))
+    assert len(modplus.flag_locks) == 0
@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from modplus.models import Infraction, InfractionType, MemberRef, ServerMember
+
+GUILD_ID = 1
+USER_ID = 10
+NOW = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def make_infraction(
+    id: str, *, user_id: int = USER_ID, at: datetime = NOW, type=InfractionType.WARN
+) -> Infraction:
+    return Infraction(
+        type=type,
+        reason=f"reason {id}",
+        at=at,
+        duration=None,
+        violator=MemberRef(GUILD_ID, user_id),
+        issuer_id=5,
+        id=id,
+    )
+
+
+DOCUMENT = ("INFRACTIONS", str(GUILD_ID), "members")
+
+
+def store_infractions(config, user_id: int, infractions: list[Infraction]):
+    config.store.setdefault(DOCUMENT, {})[str(user_id)] = [inf.json for inf in infractions]
+
+
+def stored_ids(config, user_id: int) -> list[str]:
+    return [inf["id"] for inf in config.store.get(DOCUMENT, {}).get(str(user_id), ())]
+
+
+def test_delete_cache_loaded_infraction(config, cog):
+    store_infractions(
+        config, USER_ID, [make_infraction("1"), make_infraction("2", at=NOW + timedelta(hours=1))]
+    )
+
+    async def main():
+        (first, second) = await cog.infraction_cache.get_infractions(GUILD_ID, USER_ID)
+        # looked up on its own, like the infraction a delete button holds
+        sm = await ServerMember.from_ids(cog, *first.violator)
+        await sm.delete_infraction(cog, first)
+        assert [inf.id for inf in sm.infractions] == [second.id]
+        return second
+
+    second = asyncio.run(main())
+    assert stored_ids(config, USER_ID) == [second.id]
+
+
+def test_loaded_member_does_not_share_the_cached_list(config, cog):
+    store_infractions(config, USER_ID, [make_infraction("1")])
+
+    async def main():
+        sm = await ServerMember.from_ids(cog, GUILD_ID, USER_ID)
+        await sm.delete_infraction(cog, sm.infractions[0])
+        return sm, await cog.infraction_cache.get_infractions(GUILD_ID, USER_ID)
+
+    sm, cached = asyncio.run(main())
+    assert sm.infractions == [] and list(cached) == []
+    assert DOCUMENT not in config.store
+
+
+def test_saving_many_is_one_write(config, cog):
+    store_infractions(config, USER_ID, [make_infraction("1")])
+    store_infractions(config, USER_ID + 1, [make_infraction("2", user_id=USER_ID + 1)])
+
+    async def main():
+        await cog.infraction_cache.get_infractions(GUILD_ID, USER_ID)
+        config.writes.clear()
+        await cog.infraction_cache.add_many(
+            GUILD_ID,
+            [make_infraction(None, user_id=USER_ID), make_infraction(None, user_id=USER_ID + 2)],
+        )
+
+    asyncio.run(main())
+    assert [path for path in config.writes if path[0] == "INFRACTIONS"] == [DOCUMENT]
+    assert [stored_ids(config, USER_ID + n) for n in range(3)] == [["1", "3"], ["2"], ["4"]]
+
+
+def test_member_infractions_are_moved_into_the_guild_document(config, cog):
+    config.store[("MEMBER", str(GUILD_ID), str(USER_ID), "infractions")] = [
+        make_infraction("1").json
+    ]
+
+    async def main():
+        return await cog.infraction_cache.get_infractions(GUILD_ID, USER_ID)
+
+    (infraction,) = asyncio.run(main())
+    assert infraction.id == "1"
+    assert stored_ids(config, USER_ID) == ["1"]
+    assert ("MEMBER", str(GUILD_ID), str(USER_ID), "infractions") not in config.store
+    assert config.store[("GLOBAL", "infractions_migrated")] is True
+
+
+def test_import_skips_duplicates_and_renumbers_collisions(config, cog):
+    store_infractions(config, USER_ID, [make_infraction("1")])
+
+    async def main():
+        await cog.infraction_cache.get_infractions(GUILD_ID, USER_ID)
+        imported = await cog.infraction_cache.import_many(
+            GUILD_ID,
+            [
+                # exported from this guild before, already here
+                make_infraction("1"),
+                # another guild's infraction 1
+                make_infraction("1", user_id=USER_ID + 1, at=NOW + timedelta(hours=1)),
+            ],
+        )
+        return imported, await cog.infraction_cache.get_infractions(GUILD_ID, USER_ID + 1)
+
+    imported, (other,) = asyncio.run(main())
+    assert imported == 1
+    assert other.id not in (None, "1")
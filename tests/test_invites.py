@@ -0,0 +1,23 @@
+import asyncio
+import time
+from modplus.invites import InvitePool
+
+
+def test_pooled_invites_are_reused_after_a_reload(config):
+    async def main():
+        pool = InvitePool(config, 3600, 60)
+        pool.configure(1, 100, 2)
+        assert await pool.next_refill() == (100, 2)
+        pool.put(100, "https://discord.gg/a", time.time())
+        pool.put(100, "https://discord.gg/b", time.time())
+        assert pool.pop(100) == "https://discord.gg/a"
+        await pool.save()
+
+        reloaded = InvitePool(config, 3600, 60)
+        await reloaded.load()
+        reloaded.configure(1, 100, 2)
+        return await reloaded.next_refill(), reloaded.pop(100)
+
+    (server_id, missing), invite = asyncio.run(main())
+    assert (server_id, missing) == (100, 1)
+    assert invite == "https://discord.gg/b"
@@ -0,0 +1,47 @@
+import asyncio
+import discord
+from modplus.views import FirstItemButton, InfractionPagination, PaginatorSelect
+from test_infractions import GUILD_ID, USER_ID, make_infraction, store_infractions
+
+
+class FakeContext:
+    def __init__(self, cog):
+        self.cog = cog
+
+
+class FakeResponse:
+    def __init__(self):
+        self.edits: list[dict] = []
+
+    async def edit_message(self, **kwargs):
+        self.edits.append(kwargs)
+
+
+class FakeInteraction:
+    def __init__(self):
+        self.response = FakeResponse()
+
+
+def test_delete_rebuilds_the_page_count(config, cog):
+    infractions = [make_infraction(str(i)) for i in range(1, 4)]
+    store_infractions(config, USER_ID, infractions)
+
+    async def main():
+        cached = list(await cog.infraction_cache.get_infractions(GUILD_ID, USER_ID))
+        view = InfractionPagination(
+            FakeContext(cog), cached, lambda inf: discord.Embed(title=inf.id)
+        )
+        view.use_select = True
+        view._add_navigation()
+        view.index = 2
+        await view.delete_button.callback(FakeInteraction())
+        return view
+
+    view = asyncio.run(main())
+    assert len(view.contents) == 2 and view.index == 1
+    (select,) = [i for i in view.children if isinstance(i, PaginatorSelect)]
+    assert [o.label for o in select.options] == ["1", "2"]
+    # two pages only get the back and forward buttons
+    assert not any(isinstance(i, FirstItemButton) for i in view.children)
+    assert view.children[-1] is view.delete_button
+    assert view.delete_button.infraction.id == "2"
@@ -0,0 +1,79 @@
+import asyncio
+import time
+import pytest
+from modplus.cache import InfractionCache
+from modplus.models import InfractionType
+from modplus.scheduler import RETRY_DELAY, Expiry, ExpiryScheduler
+from test_infractions import GUILD_ID, USER_ID, make_infraction, store_infractions
+
+
+def stored(config) -> dict:
+    return {path[1:3]: value for path, value in config.store.items() if path[0] == "EXPIRIES"}
+
+
+def test_failed_expiry_is_retried_with_backoff(config):
+    async def main():
+        scheduler = ExpiryScheduler(config)
+        await scheduler.load()
+        await scheduler.schedule(time.time() - 1, 1, 10, "5")
+
+        expiry = await scheduler.next_expired()
+        await scheduler.retry(expiry)
+        retried = scheduler._pending[expiry.key]
+        assert retried.attempts == 1
+        assert retried.deadline >= time.time() + RETRY_DELAY - 1
+        assert config.store[("EXPIRIES", "1", "5", "attempts")] == 1
+
+        # only handed out again once the backoff is over
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(scheduler.next_expired(), 0.05)
+        scheduler._push(retried._replace(deadline=time.time() - 1))
+        expiry = await scheduler.next_expired()
+        await scheduler.done(expiry)
+        return scheduler
+
+    scheduler = asyncio.run(main())
+    assert len(scheduler) == 0
+    assert stored(config) == {}
+
+
+def test_unfinished_expiry_survives_a_restart(config):
+    async def main():
+        scheduler = ExpiryScheduler(config)
+        await scheduler.load()
+        await scheduler.schedule_many(
+            [Expiry(time.time() - 1, 1, 10, "5"), Expiry(time.time() + 3600, 1, 11, "6")]
+        )
+        # handed out, but the bot stops before it's applied
+        await scheduler.next_expired()
+
+        restarted = ExpiryScheduler(config)
+        await restarted.load()
+        return await restarted.next_expired()
+
+    expiry = asyncio.run(main())
+    assert (expiry.guild_id, expiry.user_id, expiry.infraction_id) == (1, 10, "5")
+
+
+def test_renumbered_tempban_keeps_its_expiry(config):
+    tempbans = [
+        make_infraction("a1b2c3d4", user_id=user_id, type=InfractionType.TEMPBAN)
+        for user_id in (USER_ID, USER_ID + 1)
+    ]
+    store_infractions(config, USER_ID, tempbans[:1])
+    store_infractions(config, USER_ID + 1, tempbans[1:])
+
+    async def main():
+        scheduler = ExpiryScheduler(config)
+        # both tempbans were scheduled under the shared id, the last one won
+        await scheduler.schedule(time.time() - 1, GUILD_ID, USER_ID + 1, "a1b2c3d4")
+        cache = InfractionCache(config, None, scheduler)
+        (renumbered,) = await cache.get_infractions(GUILD_ID, USER_ID + 1)
+        expiry = await scheduler.next_expired()
+        return renumbered, expiry, await cache.get_infraction(*expiry[1:4])
+
+    renumbered, expiry, infraction = asyncio.run(main())
+    assert renumbered.id != "a1b2c3d4"
+    assert (expiry.user_id, expiry.infraction_id) == (USER_ID + 1, renumbered.id)
+    assert infraction is renumbered
+    assert list(stored(config)) == [(str(GUILD_ID), renumbered.id)]
@@ -0,0 +1,14 @@
+from modplus.cache import SnapshotCache
+
+
+def test_snapshot_cache_rebuilds_for_a_new_snapshot():
+    builds = []
+    cache = SnapshotCache(lambda source: builds.append(dict(source)) or len(builds))
+    first, second = {"a": "b"}, {"a": "b"}
+
+    assert cache.get(1, first) == 1
+    assert cache.get(1, first) == 1
+    # equal but not the same object, as after a refresh
+    assert cache.get(1, second) == 2
+    assert cache.get(2, second) == 3
+    assert builds == [{"a": "b"}] * 3
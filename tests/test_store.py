@@ -0,0 +1,67 @@
+from datetime import timedelta
+from modplus.models import Infraction, InfractionType, MemberRef
+from modplus.store import ColumnarInfractionStore
+from test_infractions import GUILD_ID, NOW
+
+# the largest snowflake a uint64 column has to hold
+BIG_ID = 2**64 - 1
+
+
+def fields(inf: Infraction) -> tuple:
+    return (
+        inf.type,
+        inf.reason,
+        inf.at_us,
+        inf.duration_us,
+        inf.violator,
+        inf.issuer_id,
+        inf.id,
+    )
+
+
+def test_save_and_load_round_trip(tmp_path):
+    store = ColumnarInfractionStore(tmp_path)
+    members = {
+        BIG_ID: [
+            Infraction(
+                InfractionType.BAN,
+                "raid 🚨 — spammed ссылки",
+                NOW,
+                None,
+                MemberRef(GUILD_ID, BIG_ID),
+                BIG_ID - 1,
+                id="1",
+            ),
+            Infraction(
+                InfractionType.TEMPBAN,
+                "荒らし",
+                NOW + timedelta(seconds=1),
+                timedelta(days=7),
+                MemberRef(GUILD_ID, BIG_ID),
+                5,
+                id="2",
+            ),
+        ],
+        10: [
+            Infraction(
+                InfractionType.WARN, "", NOW, None, MemberRef(GUILD_ID, 10), 5, id="荒らし"
+            )
+        ],
+    }
+
+    store.save_guild(GUILD_ID, members)
+    loaded = store.load_guild(GUILD_ID)
+
+    assert store.guild_ids() == [GUILD_ID]
+    assert {user_id: [fields(inf) for inf in infs] for user_id, infs in loaded.items()} == {
+        user_id: [fields(inf) for inf in infs] for user_id, infs in members.items()
+    }
+    assert loaded[BIG_ID][0].duration is None
+
+
+def test_saving_no_infractions_removes_the_file(tmp_path):
+    store = ColumnarInfractionStore(tmp_path)
+    warn = Infraction(InfractionType.WARN, "", NOW, None, MemberRef(GUILD_ID, 10), 5, id="1")
+    store.save_guild(GUILD_ID, {10: [warn]})
+    store.save_guild(GUILD_ID, {10: []})
+    assert store.guild_ids() == [] and store.load_guild(GUILD_ID) == {}
@@ -0,0 +1,37 @@
+import asyncio
+from types import SimpleNamespace
+from modplus.main import ModPlus
+
+
+class Step:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.calls = 0
+
+    async def __call__(self, *args):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("disk full")
+
+
+def test_a_failing_unload_step_does_not_skip_the_others():
+    modplus = ModPlus.__new__(ModPlus)
+    for task in (
+        "unban_task",
+        "watchlist_task",
+        "flag_flush_task",
+        "flag_compact_task",
+        "infraction_flush_task",
+        "log_batch_task",
+        "invite_refill_task",
+    ):
+        setattr(modplus, task, SimpleNamespace(cancel=lambda: None))
+    flags, infractions, invites, batches = Step(fail=True), Step(fail=True), Step(), Step()
+    modplus.flag_store = SimpleNamespace(flush=flags)
+    modplus.infraction_cache = SimpleNamespace(flush=infractions)
+    modplus.invite_pool = SimpleNamespace(save=invites)
+    modplus.log_batcher = SimpleNamespace(pop_all=lambda: ["first", "second"])
+    modplus._send_log_batch = batches
+
+    asyncio.run(modplus.cog_unload())
+    assert [flags.calls, infractions.calls, invites.calls, batches.calls] == [1, 1, 1, 2]